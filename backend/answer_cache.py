@@ -0,0 +1,88 @@
+# backend/answer_cache.py
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """ Lowercases, collapses whitespace and drops trailing punctuation. """
+    question = re.sub(r"\s+", " ", question).strip().lower()
+    return question.rstrip("?.! ")
+
+
+def cache_key(question: str, template: str) -> str:
+    """ Key for a question asked with a given prompt template. """
+    raw = f"{template}\x00{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Two-tier exact-match answer cache.
+
+    The memory tier is an LRU bounded by max_entries with a per-entry TTL.
+    The persistent tier is any async callable mapping a list of keys to
+    {key: stored answer} for those it has; hits there are promoted into memory.
+    Every entry remembers the key of the stored answer it came from (itself,
+    unless put() was given another), so a hit can be credited to that answer.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, persistent_lookup=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent_lookup = persistent_lookup
+        self._entries = OrderedDict()
+        self.hits = {"memory": 0, "persistent": 0}
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get(self, *keys: str):
+        """
+        Returns (answer, tier, source_key) for the first of 'keys' (best first)
+        that is cached, or None. One call is one lookup, whatever the number of keys.
+        """
+        now = time.monotonic()
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, expires, source_key = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return answer, "memory", source_key
+                del self._entries[key]
+        if self.persistent_lookup is not None:
+            stored = await self.persistent_lookup(list(keys))
+            for key in keys:
+                if (answer := stored.get(key)) is not None:
+                    self.put(key, answer)
+                    self.hits["persistent"] += 1
+                    return answer, "persistent", key
+        self.misses += 1
+        return None
+
+    def put(self, key: str, answer: str, source_key: str = None):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (answer, time.monotonic() + self.ttl, source_key or key)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,426 @@
+# backend/benchmark.py
+"""
+Load benchmark for the backend, run against fake_gemini.py instead of the real API.
+
+For each dataset size it boots main.py under uvicorn in a scratch directory,
+seeds it through /api/import, then drives every scenario at every
+concurrency level and records throughput and p50/p95/p99 latency. Results
+are written as JSON tagged with the git commit, so runs can be compared:
+
+    python benchmark.py --datasets 10:10,100000:10000 --concurrency 1,16,64 -o before.json
+    python benchmark.py ... -o after.json --compare before.json
+
+Each run first checks startup: the median time to import main (against
+--import-budget; over budget exits 1) and how long a fresh process takes
+to answer /health and /ready. --startup-only stops there.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+WORDS = ["react", "hooks", "state", "props", "effect", "router", "fastapi", "async", "pydantic",
+         "component", "render", "context", "reducer", "memo", "query", "endpoint", "dependency"]
+
+
+# --- Scenarios ---
+# Each maps a request number to (method, path, request kwargs). 'setup' runs once, unmeasured.
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+class Scenario:
+    def __init__(self, name, build, setup=None):
+        self.name = name
+        self.build = build
+        self.setup = setup
+
+
+def ask_scenarios(run_id: str):
+    def uncached(i, ctx):
+        # Unique per run and request, so every ask goes upstream
+        return "POST", "/api/ask", {"json": {"question": f"{run_id} question {i}: what is {random_text(ctx['rng'], 3)}?"}}
+
+    async def warm(client, ctx):
+        for q in range(10):
+            await client.post("/api/ask", json={"question": f"warm question {q}"})
+
+    def cached(i, ctx):
+        return "POST", "/api/ask", {"json": {"question": f"warm question {i % 10}"}}
+
+    def stream(i, ctx):
+        return "POST", "/api/ask/stream", {"json": {"question": f"{run_id} stream {i}: {random_text(ctx['rng'], 3)}"}}
+
+    return [
+        Scenario("ask_uncached", uncached),
+        Scenario("ask_cached", cached, warm),
+        Scenario("ask_stream", stream),
+    ]
+
+
+def history_scenarios():
+    def first_page(i, ctx):
+        return "GET", "/api/history", {"params": {"limit": 50}}
+
+    def get_item(i, ctx):
+        return "GET", f"/api/history/{ctx['rng'].randint(1, max(1, ctx['history_rows']))}", {}
+
+    def search(i, ctx):
+        return "GET", "/api/history/search", {"params": {"q": ctx["rng"].choice(WORDS)}}
+
+    return [
+        Scenario("history_page", first_page),
+        Scenario("history_get", get_item),
+        Scenario("history_search", search),
+    ]
+
+
+def file_scenarios(run_id: str):
+    def list_page(i, ctx):
+        return "GET", "/api/files", {"params": {"limit": 100}}
+
+    def read(i, ctx):
+        return "GET", f"/api/files/seed-{ctx['rng'].randrange(max(1, ctx['files']))}.txt", {}
+
+    def create(i, ctx):
+        return "POST", "/api/files", {"json": {"filename": f"{run_id}-{i}.txt", "content": random_text(ctx["rng"], 200)}}
+
+    def update(i, ctx):
+        return "PUT", f"/api/files/{run_id}-{i}.txt", {"json": {"content": random_text(ctx["rng"], 200)}}
+
+    def delete(i, ctx):
+        return "DELETE", f"/api/files/{run_id}-{i}.txt", {}
+
+    # update and delete work on the files create just made, so the order matters
+    return [
+        Scenario("files_list", list_page),
+        Scenario("files_read", read),
+        Scenario("files_create", create),
+        Scenario("files_update", update),
+        Scenario("files_delete", delete),
+    ]
+
+
+# --- Load generation ---
+def percentile(sorted_values: list, pct: float) -> float:
+    """ Nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def run_load(client: httpx.AsyncClient, scenario: Scenario, ctx: dict, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = {}
+    next_request = iter(range(requests))
+
+    async def worker():
+        for i in next_request:
+            method, path, kwargs = scenario.build(i, ctx)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+# --- Processes ---
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(args: list, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, log_path: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with {process.returncode}; see {log_path}")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s; see {log_path}")
+
+
+def stop_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def seed_records(history_rows: int, files: int, rng: random.Random):
+    """ NDJSON import body for a dataset, generated lazily. """
+    batch = []
+    for i in range(history_rows):
+        record = {"type": "history", "question": f"seed question {i} about {random_text(rng, 4)}",
+                  "answer": random_text(rng, 80)}
+        batch.append(json.dumps(record) + "\n")
+        if len(batch) >= 1000:
+            yield "".join(batch).encode()
+            batch = []
+    for i in range(files):
+        batch.append(json.dumps({"type": "file", "name": f"seed-{i}.txt", "content": random_text(rng, 200)}) + "\n")
+        if len(batch) >= 1000:
+            yield "".join(batch).encode()
+            batch = []
+    if batch:
+        yield "".join(batch).encode()
+
+
+def backend_env(args, workdir: str, gemini_url: str) -> dict:
+    return {
+        "DATABASE_FILE": os.path.join(workdir, "learning_history.db"),
+        "FILES_DIR": os.path.join(workdir, "files"),
+        "SEMANTIC_CACHE_DIR": os.path.join(workdir, "chroma_db"),
+        "SEMANTIC_CACHE_ENABLED": "1" if args.semantic_cache else "0",
+        "GEMINI_API_URL": gemini_url,
+        "WEB_CONCURRENCY": str(args.workers),
+        # The fake has no quota; keep the client-side limiter out of the measurement
+        "GEMINI_RPM": "1000000000",
+        "GEMINI_TPM": "1000000000000",
+    }
+
+
+def start_backend(args, workdir: str, gemini_url: str, port: int) -> subprocess.Popen:
+    return start_process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--workers", str(args.workers)],
+        backend_env(args, workdir, gemini_url), os.path.join(workdir, "backend.log"),
+    )
+
+
+async def bench_startup(args, gemini_url: str, workdir: str) -> dict:
+    """ Median time to import main, then time from launch until /health and /ready answer. """
+    script = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    env = {**os.environ, **backend_env(args, workdir, gemini_url)}
+    imports = sorted(
+        float(subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout.split()[-1])
+        for _ in range(args.startup_runs)
+    )
+    port = free_port()
+    log_path = os.path.join(workdir, "backend.log")
+    launched = time.perf_counter()
+    backend = start_backend(args, workdir, gemini_url, port)
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/health", backend, log_path)
+        serving_s = time.perf_counter() - launched
+        await wait_ready(f"http://127.0.0.1:{port}/ready", backend, log_path)
+        ready_s = time.perf_counter() - launched
+    finally:
+        stop_process(backend)
+    import_s = imports[len(imports) // 2]
+    result = {
+        "scenario": "startup", "history_rows": 0, "files": 0, "concurrency": 1,
+        "import_s": round(import_s, 4), "serving_s": round(serving_s, 4), "ready_s": round(ready_s, 4),
+        "import_budget_s": args.import_budget, "within_budget": import_s <= args.import_budget,
+    }
+    print(f"Startup: import main {import_s * 1000:.0f}ms (budget {args.import_budget * 1000:.0f}ms), "
+          f"serving after {serving_s * 1000:.0f}ms, ready after {ready_s * 1000:.0f}ms", file=sys.stderr)
+    return result
+
+
+async def bench_dataset(args, history_rows: int, files: int, gemini_url: str, workdir: str) -> list:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(workdir, "backend.log")
+    backend = start_backend(args, workdir, gemini_url, port)
+    results = []
+    try:
+        # Measure a warmed-up instance: wait for the background warm-up too
+        await wait_ready(f"{base_url}/ready", backend, log_path)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            started = time.perf_counter()
+            response = await client.post("/api/import", content=seed_records(history_rows, files, random.Random(args.seed)))
+            response.raise_for_status()
+            seed_s = time.perf_counter() - started
+            print(f"Seeded {history_rows} history rows and {files} files in {seed_s:.1f}s", file=sys.stderr)
+
+            for concurrency in args.concurrency:
+                # Fresh question and file names per level: asks stay uncached and the
+                # create/update/delete chain works on files nobody touched yet
+                run_id = f"bench-{port}-c{concurrency}"
+                scenarios = ask_scenarios(run_id) + history_scenarios() + file_scenarios(run_id)
+                ctx = {"rng": random.Random(args.seed), "history_rows": history_rows, "files": files}
+                for scenario in scenarios:
+                    if args.scenarios and scenario.name not in args.scenarios:
+                        continue
+                    if scenario.setup is not None:
+                        await scenario.setup(client, ctx)
+                    stats = await run_load(client, scenario, ctx, args.requests, concurrency)
+                    results.append({"scenario": scenario.name, "history_rows": history_rows, "files": files,
+                                    "concurrency": concurrency, **stats})
+                    print(f"  {scenario.name:<15} c={concurrency:<4} {stats['throughput_rps']:>9.1f} req/s  "
+                          f"p50 {stats['p50_ms']:>8.1f}ms  p95 {stats['p95_ms']:>8.1f}ms  "
+                          f"p99 {stats['p99_ms']:>8.1f}ms  errors {sum(stats['errors'].values())}", file=sys.stderr)
+            results.append({"scenario": "seed_import", "history_rows": history_rows, "files": files,
+                            "concurrency": 1, "elapsed_s": round(seed_s, 3)})
+    finally:
+        stop_process(backend)
+    return results
+
+
+# --- Results ---
+def git_revision() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def compare(results: list, baseline_path: str):
+    """ Prints throughput and p95 change against a previous results file. """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r["scenario"], r["history_rows"], r["files"], r["concurrency"])
+    before = {key(r): r for r in baseline["results"] if "p95_ms" in r}
+    print(f"\nCompared with {baseline['meta']['commit'][:12]} ({baseline_path}):", file=sys.stderr)
+    for result in results:
+        old = before.get(key(result))
+        if old is None or "p95_ms" not in result:
+            continue
+        change = lambda new, prev: f"{(new - prev) / prev * 100:+7.1f}%" if prev else "    n/a"
+        print(f"  {result['scenario']:<15} rows={result['history_rows']:<7} files={result['files']:<6} "
+              f"c={result['concurrency']:<4} throughput {change(result['throughput_rps'], old['throughput_rps'])}  "
+              f"p95 {change(result['p95_ms'], old['p95_ms'])}", file=sys.stderr)
+
+
+def parse_datasets(value: str) -> list:
+    """ "10:10,100000:10000" -> [(10, 10), (100000, 10000)] as (history rows, files). """
+    datasets = []
+    for part in value.split(","):
+        rows, _, files = part.partition(":")
+        datasets.append((int(rows), int(files or 0)))
+    return datasets
+
+
+def parse_ints(value: str) -> list:
+    return [int(part) for part in value.split(",")]
+
+
+async def main(args):
+    workroot = tempfile.mkdtemp(prefix="la-bench-")
+    gemini_port = free_port()
+    gemini_url = f"http://127.0.0.1:{gemini_port}"
+    gemini_log = os.path.join(workroot, "fake_gemini.log")
+    fake = start_process(
+        [sys.executable, "fake_gemini.py", "--port", str(gemini_port), "--latency", str(args.latency),
+         "--jitter", str(args.jitter), "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+         "--answer-bytes", str(args.answer_bytes), "--stream-chunks", str(args.stream_chunks),
+         "--chunk-delay", str(args.chunk_delay)],
+        {}, gemini_log,
+    )
+    results = []
+    try:
+        await wait_ready(f"{gemini_url}/stats", fake, gemini_log)
+        startup_dir = os.path.join(workroot, "startup")
+        os.makedirs(startup_dir)
+        results.append(await bench_startup(args, gemini_url, startup_dir))
+        for history_rows, files in ([] if args.startup_only else args.datasets):
+            print(f"Dataset: {history_rows} history rows, {files} files", file=sys.stderr)
+            workdir = os.path.join(workroot, f"{history_rows}-{files}")
+            os.makedirs(workdir)
+            results += await bench_dataset(args, history_rows, files, gemini_url, workdir)
+    finally:
+        stop_process(fake)
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "started": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workdir": workroot,
+            "options": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+    if not results[0]["within_budget"]:
+        print(f"Importing main took longer than the {args.import_budget}s budget.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--datasets", type=parse_datasets, default="10:10,10000:1000",
+                        help="history_rows:files pairs, comma separated (default: 10:10,10000:1000)")
+    parser.add_argument("--concurrency", type=parse_ints, default="1,8,32", help="Comma separated client concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=None, help="Only run these scenarios")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the backend")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request client timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for generated data and requests")
+    parser.add_argument("--semantic-cache", action="store_true", help="Leave the semantic cache enabled")
+    parser.add_argument("--import-budget", type=float, default=1.0,
+                        help="Seconds 'import main' may take; the run exits 1 when it is exceeded")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Imports timed for the median")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure import and boot times")
+    # Fake Gemini behaviour
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Gemini calls that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--answer-bytes", type=int, default=2000)
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="Results file, or - for stdout")
+    parser.add_argument("--compare", help="Previous results file to print deltas against")
+    asyncio.run(main(parser.parse_args()))
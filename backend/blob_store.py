@@ -0,0 +1,258 @@
+# backend/blob_store.py
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+from file_lock import FileLock
+
+CHANGES_KEPT = 10000  # file_changes rows kept for workers catching up; older ones force a full rebuild
+READ_CHUNK_BYTES = 64 * 1024  # Decompressed bytes per chunk when streaming a blob
+
+
+class BlobStore:
+    """
+    Content-addressed, gzip-compressed storage for the files/ directory.
+
+    Each distinct content is stored once under files/.objects/<aa>/<sha256>.gz;
+    the human-readable filenames live in the 'file_names' table as a
+    name -> hash index. Blobs no longer referenced by any name are removed.
+    Plain files in root (the tracked corpus, or files dropped in) are indexed
+    in place and never modified; 'plain_files' remembers the size and mtime
+    each was imported at, so one is only re-imported when it changes on disk.
+    Methods are blocking and use db.connect(), so call them through db.run().
+
+    Safe to share between processes: writes go to a temp file and are renamed
+    into place, reference counting is serialized by a lock file in root, and
+    every name change is appended to 'file_changes' so other processes can
+    catch their in-memory listing up with changes_since().
+    """
+
+    def __init__(self, root: str, db, compresslevel: int = 6):
+        self.root = root
+        self.objects_dir = os.path.join(root, ".objects")
+        self.db = db
+        self.compresslevel = compresslevel
+        # Serializes reference counting against blob removal, across threads and processes
+        self._lock = FileLock(os.path.join(root, ".lock"))
+
+    def create_tables(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        conn = self.db.connect()
+        with self._lock:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_names (
+                    name TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_file_names_hash ON file_names (hash)")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS file_changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL
+                );
+                CREATE TRIGGER IF NOT EXISTS file_names_changes_insert AFTER INSERT ON file_names BEGIN
+                    INSERT INTO file_changes (name) VALUES (new.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS file_names_changes_update AFTER UPDATE ON file_names BEGIN
+                    INSERT INTO file_changes (name) VALUES (new.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS file_names_changes_delete AFTER DELETE ON file_names BEGIN
+                    INSERT INTO file_changes (name) VALUES (old.name);
+                END;
+                CREATE TABLE IF NOT EXISTS plain_files (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+            """)
+            conn.commit()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest + ".gz")
+
+    def _write_blob(self, digest: str, data: bytes):
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return  # Same content already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(data, self.compresslevel, mtime=0))
+        os.replace(tmp_path, path)
+
+    def _release(self, conn, digest: str):
+        """ Deletes a blob once no name points at it. """
+        if conn.execute("SELECT 1 FROM file_names WHERE hash = ? LIMIT 1", (digest,)).fetchone() is None:
+            try:
+                os.remove(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def put(self, name: str, content, mtime: float = None):
+        """ Stores content (str or bytes) under name; returns (size, mtime, digest). """
+        _, size, mtime, digest = self.put_many([(name, content, mtime)])[0]
+        return size, mtime, digest
+
+    def put_many(self, items: list):
+        """
+        Stores (name, content, mtime or None) entries in one transaction.
+        Returns [(name, size, mtime, digest), ...].
+        """
+        conn = self.db.connect()
+        stored = []
+        replaced = []
+        with self._lock:
+            try:
+                for name, content, mtime in items:
+                    data = content.encode("utf-8") if isinstance(content, str) else content
+                    digest = hashlib.sha256(data).hexdigest()
+                    mtime = time.time() if mtime is None else mtime
+                    self._write_blob(digest, data)
+                    row = conn.execute("SELECT hash FROM file_names WHERE name = ?", (name,)).fetchone()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO file_names (name, hash, size, mtime) VALUES (?, ?, ?, ?)",
+                        (name, digest, len(data), mtime),
+                    )
+                    if row and row[0] != digest:
+                        replaced.append(row[0])
+                    stored.append((name, len(data), mtime, digest))
+                self._prune_changes(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            for digest in replaced:
+                self._release(conn, digest)
+        return stored
+
+    def delete(self, name: str) -> bool:
+        conn = self.db.connect()
+        with self._lock:
+            row = conn.execute("SELECT hash FROM file_names WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM file_names WHERE name = ?", (name,))
+            self._prune_changes(conn)
+            conn.commit()
+            self._release(conn, row[0])
+        return True
+
+    @staticmethod
+    def _prune_changes(conn):
+        conn.execute(
+            "DELETE FROM file_changes WHERE version <= (SELECT MAX(version) FROM file_changes) - ?",
+            (CHANGES_KEPT,),
+        )
+
+    def changes_since(self, version):
+        """
+        Returns (latest_version, full, rows) from one consistent snapshot.
+        With full=False, rows are (name, size, mtime, digest) for every name
+        changed after 'version', with None fields for deleted names. With
+        full=True ('version' is None or too old), rows are all entries().
+        """
+        conn = self.db.connect()
+        conn.execute("BEGIN")
+        try:
+            latest, oldest = conn.execute("SELECT MAX(version), MIN(version) FROM file_changes").fetchone()
+            latest = latest or 0
+            if version is None or (oldest is not None and version < oldest - 1):
+                return latest, True, self.entries()
+            rows = conn.execute("""
+                SELECT c.name, f.size, f.mtime, f.hash
+                FROM (SELECT DISTINCT name FROM file_changes WHERE version > ?) c
+                LEFT JOIN file_names f ON f.name = c.name
+            """, (version,)).fetchall()
+            return latest, False, rows
+        finally:
+            conn.commit()
+
+    def read_bytes(self, digest: str) -> bytes:
+        with gzip.open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def read(self, digest: str) -> str:
+        return self.read_bytes(digest).decode("utf-8", errors="replace")
+
+    def open_range(self, digest: str, start: int = 0, length: int = None):
+        """
+        Iterator over 'length' decompressed bytes of a blob from 'start' (to the
+        end if None), read a chunk at a time. The blob is opened here, so a
+        missing one raises FileNotFoundError before any byte is sent.
+        """
+        f = gzip.open(self.blob_path(digest), "rb")
+        return self._iter_range(f, start, length)
+
+    @staticmethod
+    def _iter_range(f, start: int, length: int):
+        with f:
+            f.seek(start)  # Decompresses and discards up to start, without holding it in memory
+            while length is None or length > 0:
+                chunk = f.read(READ_CHUNK_BYTES if length is None else min(READ_CHUNK_BYTES, length))
+                if not chunk:
+                    return
+                if length is not None:
+                    length -= len(chunk)
+                yield chunk
+
+    def entries(self) -> list:
+        """ [(name, size, mtime, digest), ...] for every stored file. """
+        return self.db.connect().execute("SELECT name, size, mtime, hash FROM file_names").fetchall()
+
+    def import_plain(self, name: str):
+        """
+        Copies a plain file in root into the store, keeping its mtime and
+        leaving the file where it is. Returns (size, mtime, digest), or None
+        if it isn't a regular file or hasn't changed since it was imported.
+        A file seen for the first time never replaces a name that is
+        already stored (e.g. edited through the API).
+        """
+        path = os.path.join(self.root, name)
+        if name.startswith("."):
+            return None
+        conn = self.db.connect()
+        # Every worker's watcher sees the same drop; the first to get the lock imports it
+        with self._lock:
+            if not os.path.isfile(path):
+                return None
+            st = os.stat(path)
+            seen = conn.execute("SELECT size, mtime FROM plain_files WHERE name = ?", (name,)).fetchone()
+            if seen == (st.st_size, st.st_mtime):
+                return None
+            stored = None
+            if seen is not None or conn.execute("SELECT 1 FROM file_names WHERE name = ?", (name,)).fetchone() is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+                stored = self.put(name, data, mtime=st.st_mtime)
+            conn.execute(
+                "INSERT OR REPLACE INTO plain_files (name, size, mtime) VALUES (?, ?, ?)",
+                (name, st.st_size, st.st_mtime),
+            )
+            conn.commit()
+        return stored
+
+    def import_plain_files(self) -> int:
+        """ Imports every plain file in root that is new or changed since it was last imported. """
+        count = 0
+        with os.scandir(self.root) as it:
+            names = [entry.name for entry in it if entry.is_file() and not entry.name.startswith(".")]
+        for name in names:
+            if self.import_plain(name) is not None:
+                count += 1
+        return count
+
+    def stats(self) -> dict:
+        conn = self.db.connect()
+        names, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM file_names").fetchone()
+        blobs = stored = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                if filename.endswith(".gz"):
+                    blobs += 1
+                    stored += os.path.getsize(os.path.join(dirpath, filename))
+        return {"names": names, "blobs": blobs, "logical_bytes": logical, "stored_bytes": stored}
@@ -0,0 +1,222 @@
+# backend/content_encoding.py
+import asyncio
+import json
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+OFFLOAD_BYTES = 256 * 1024  # Bodies at least this big are compressed off the event loop
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON rendered with orjson when it is installed, else compact stdlib json.
+
+    Return one from an endpoint with plain dicts/lists to skip FastAPI's
+    response_model validation and serialization; keep response_model on the
+    route for the OpenAPI schema.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return lambda data, last: compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self.quality = quality
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self):
+        compressor = brotli.Compressor(quality=self.quality)
+        return lambda data, last: compressor.process(data) + (compressor.finish() if last else compressor.flush())
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return lambda data, last: compressor.compress(data) + compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if last else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+
+def available_encoders(gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3) -> dict:
+    """ {content-coding: encoder} for the codecs installed here; gzip is always there. """
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd(zstd_level)
+    if brotli is not None:
+        encoders["br"] = _Brotli(brotli_quality)
+    encoders["gzip"] = _Gzip(gzip_level)
+    return encoders
+
+
+def negotiate(accept_encoding: str, preference: list):
+    """
+    Picks the coding from 'preference' (best first) the client rates highest
+    in its Accept-Encoding, or None. Equal q-values go by our preference;
+    '*' covers codings the header doesn't name, and q=0 refuses one.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    best, best_q = None, 0.0
+    for coding in preference:
+        q = qualities.get(coding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with zstd, brotli or gzip, whichever the client
+    accepts and is installed, preferred in the order of 'encodings'.
+
+    Left alone: bodies under minimum_size, types that don't compress (see
+    COMPRESSIBLE_TYPES), responses that already carry a Content-Encoding
+    (e.g. the gzip blobs served by /api/files/{filename}/raw), partial
+    content and Server-Sent Events, whose events must not wait on a
+    compressor. Other streams are flushed chunk by chunk. A strong ETag is
+    weakened on compressed responses, as the bytes differ from the identity
+    encoding's. on_compress(coding, original_bytes, sent_bytes) is called
+    for every compressed response.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, encodings: list = ("zstd", "br", "gzip"),
+                 gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3, on_compress=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encoders(gzip_level, brotli_quality, zstd_level)
+        self.preference = [coding for coding in encodings if coding in self.encoders]
+        self.on_compress = on_compress
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.preference)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(self, coding, send).send)
+
+
+class _Responder:
+    def __init__(self, middleware: CompressionMiddleware, coding: str, send):
+        self.middleware = middleware
+        self.coding = coding
+        self.downstream = send
+        self.start = None
+        self.passthrough = False
+        self.compress_chunk = None
+        self.original_bytes = 0
+        self.sent_bytes = 0
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self.start["status"] in (204, 206, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message  # Held until the first body chunk shows the size
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compress_chunk is None:
+            headers = MutableHeaders(scope=self.start)
+            if not self._compressible(headers):
+                self.passthrough = True
+            else:
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.middleware.minimum_size:
+                    self.passthrough = True
+            if self.passthrough:
+                await self.downstream(self.start)
+                await self.downstream(message)
+                return
+            headers["Content-Encoding"] = self.coding
+            if (etag := headers.get("etag")) and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            encoder = self.middleware.encoders[self.coding]
+            if not more_body:
+                data = await self._compress(encoder.compress, body)
+                headers["Content-Length"] = str(len(data))
+                await self.downstream(self.start)
+                await self.downstream({"type": "http.response.body", "body": data})
+                self._record(len(body), len(data))
+                return
+            del headers["Content-Length"]
+            self.compress_chunk = encoder.stream()
+            await self.downstream(self.start)
+        data = self.compress_chunk(body, not more_body)
+        self.original_bytes += len(body)
+        self.sent_bytes += len(data)
+        await self.downstream({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self._record(self.original_bytes, self.sent_bytes)
+
+    async def _compress(self, compress, body: bytes) -> bytes:
+        if len(body) >= OFFLOAD_BYTES:
+            return await asyncio.to_thread(compress, body)
+        return compress(body)
+
+    def _record(self, original: int, sent: int):
+        if self.middleware.on_compress is not None:
+            self.middleware.on_compress(self.coding, original, sent)
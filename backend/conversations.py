@@ -0,0 +1,157 @@
+# backend/conversations.py
+import uuid
+
+SESSION_TEMPLATE = """In the context of ReactJS and FastAPI, continue this tutoring conversation. Answer the new question clearly and concisely, using the earlier conversation for context. Give examples when appropriate.
+
+{context}
+
+New question: {question}"""
+
+SUMMARY_TEMPLATE = """Summarize this tutoring conversation about ReactJS and FastAPI in at most {words} words. Keep the topics, code names, decisions and anything the student may refer back to; drop pleasantries and repeated explanations.
+
+{context}"""
+
+
+def count_tokens(text: str) -> int:
+    # Same rough four-characters-per-token estimate the Gemini client budgets with
+    return len(text) // 4 + 1
+
+
+def format_turns(summary: str, turns: list) -> str:
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    for turn in turns:
+        parts.append(f"Student: {turn['question']}\nTutor: {turn['answer']}")
+    return "\n\n".join(parts)
+
+
+def recent_turns(summary_tokens: int, turns: list, budget: int) -> list:
+    """ The newest turns that fit in the budget next to the summary, oldest first. """
+    selected = []
+    used = summary_tokens
+    for turn in reversed(turns):
+        if used + turn["tokens"] > budget:
+            break
+        selected.append(turn)
+        used += turn["tokens"]
+    return selected[::-1]
+
+
+def turns_to_compact(summary_tokens: int, turns: list, budget: int) -> list:
+    """
+    Oldest turns to fold into the summary once the verbatim turns outgrow the
+    budget; afterwards the remaining turns take at most half of it, so one
+    compaction buys several cheap follow-ups.
+    """
+    total = summary_tokens + sum(turn["tokens"] for turn in turns)
+    if total <= budget:
+        return []
+    folded = []
+    for turn in turns[:-1]:  # The latest turn always stays verbatim
+        if total <= budget // 2:
+            break
+        folded.append(turn)
+        total -= turn["tokens"]
+    return folded
+
+
+class ConversationStore:
+    """
+    Session-scoped conversations kept next to 'history' in the same database.
+
+    Each session has its turns plus a rolling summary of the oldest ones:
+    'summary_upto' is the last turn folded into it, so only later turns are
+    ever sent verbatim. Methods are blocking; call them through db.run().
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def create_tables(self):
+        conn = self.db.connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+                summary TEXT NOT NULL DEFAULT '',
+                summary_tokens INTEGER NOT NULL DEFAULT 0,
+                summary_upto INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS session_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_turns_session_id ON session_turns (session_id, id);
+        """)
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        conn = self.db.connect()
+        conn.execute("INSERT INTO sessions (id) VALUES (?)", (session_id,))
+        conn.commit()
+        return session_id
+
+    def delete(self, session_id: str) -> bool:
+        conn = self.db.connect()
+        try:
+            conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return deleted > 0
+
+    def load(self, session_id: str, all_turns: bool = False):
+        """
+        Returns the session with its summary and the turns not folded into it
+        (every turn with all_turns=True), or None if it doesn't exist.
+        """
+        conn = self.db.connect()
+        row = conn.execute(
+            "SELECT id, created, updated, summary, summary_tokens, summary_upto FROM sessions WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        turns = conn.execute(
+            "SELECT id, timestamp, question, answer, tokens FROM session_turns WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, 0 if all_turns else row[5]),
+        ).fetchall()
+        return {
+            "id": row[0], "created": row[1], "updated": row[2],
+            "summary": row[3], "summary_tokens": row[4], "summary_upto": row[5],
+            "turns": [
+                {"id": t[0], "timestamp": t[1], "question": t[2], "answer": t[3], "tokens": t[4]}
+                for t in turns
+            ],
+        }
+
+    def add_turn(self, session_id: str, question: str, answer: str) -> int:
+        conn = self.db.connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO session_turns (session_id, question, answer, tokens) VALUES (?, ?, ?, ?)",
+                (session_id, question, answer, count_tokens(question) + count_tokens(answer)),
+            )
+            conn.execute("UPDATE sessions SET updated = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.lastrowid
+
+    def save_summary(self, session_id: str, summary: str, upto_turn_id: int):
+        conn = self.db.connect()
+        # Never move backwards if two compactions of the same session race
+        conn.execute(
+            "UPDATE sessions SET summary = ?, summary_tokens = ?, summary_upto = ? WHERE id = ? AND summary_upto < ?",
+            (summary, count_tokens(summary), upto_turn_id, session_id, upto_turn_id),
+        )
+        conn.commit()
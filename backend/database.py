@@ -0,0 +1,102 @@
+# backend/database.py
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Database:
+    """
+    Long-lived, tuned SQLite connections, one per worker thread.
+
+    Blocking helpers are run on a small dedicated thread pool via run(), so
+    endpoints await database work instead of doing disk I/O on the event
+    loop. Each pool thread opens its connection once (WAL, synchronous=NORMAL,
+    busy timeout, mmap and page cache pragmas, statement cache) and reuses it.
+
+    Several processes may share the file. When a helper still fails with
+    "database is locked"/"busy" (a WAL snapshot conflict skips the busy
+    timeout), its transaction is rolled back and the whole helper retried
+    with jittered backoff, so helpers must be safe to re-run after a rollback.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, busy_timeout_ms: int = 5000,
+                 cache_size_kib: int = 20000, mmap_size: int = 256 * 1024 * 1024,
+                 statement_cache: int = 256, on_query=None, busy_retries: int = 5,
+                 busy_backoff: float = 0.05):
+        self.path = path
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff  # Seconds before the first retry; doubles per attempt
+        self.on_query = on_query  # Called as on_query(helper_name, seconds) after each run()
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def connect(self) -> sqlite3.Connection:
+        """ Returns the calling thread's connection, opening it on first use. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000,
+                cached_statements=self.statement_cache,
+                check_same_thread=False,  # Only closed from another thread, at shutdown
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def is_busy(error: Exception) -> bool:
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+    def call(self, fn, *args, **kwargs):
+        """ Runs a blocking helper in the calling thread, retrying it when the database is busy. """
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == self.busy_retries or not self.is_busy(e):
+                    raise
+                conn = getattr(self._local, "conn", None)
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+                time.sleep(self.busy_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def run(self, fn, *args, **kwargs):
+        """ Runs a blocking helper on the database thread pool and returns its result. """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, lambda: self.call(fn, *args, **kwargs))
+        finally:
+            if self.on_query is not None:
+                self.on_query(getattr(fn, "__name__", "query"), time.perf_counter() - start)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
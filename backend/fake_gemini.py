@@ -0,0 +1,109 @@
+# backend/fake_gemini.py
+"""
+Local stand-in for the Gemini generateContent API, used by benchmark.py.
+
+Answers after a configurable delay with a payload of a configurable size,
+streams it in chunks over SSE, and fails a configurable share of requests,
+so the backend can be load-tested without a network or a quota:
+
+    python fake_gemini.py --port 8100 --latency 0.5 --error-rate 0.02
+    GEMINI_API_URL=http://127.0.0.1:8100 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Settings come from the environment so the app also works under a plain `uvicorn fake_gemini:app`.
+LATENCY = float(os.getenv("FAKE_GEMINI_LATENCY", "0.2"))  # Seconds before the (first) response bytes
+JITTER = float(os.getenv("FAKE_GEMINI_JITTER", "0.05"))  # +/- seconds of uniform noise on LATENCY
+ERROR_RATE = float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0"))  # Share of requests answered with ERROR_STATUS
+ERROR_STATUS = int(os.getenv("FAKE_GEMINI_ERROR_STATUS", "503"))
+ANSWER_BYTES = int(os.getenv("FAKE_GEMINI_ANSWER_BYTES", "2000"))  # Size of each generated answer
+STREAM_CHUNKS = int(os.getenv("FAKE_GEMINI_STREAM_CHUNKS", "20"))  # SSE events per streamed answer
+CHUNK_DELAY = float(os.getenv("FAKE_GEMINI_CHUNK_DELAY", "0.02"))  # Seconds between SSE events
+
+app = FastAPI(title="Fake Gemini")
+counts = {"requests": 0, "errors": 0, "streams": 0}
+
+
+def make_answer(prompt: str) -> str:
+    # Deterministic per prompt, so repeated questions get identical answers
+    words = f"Answer to: {prompt[-80:]}".split() + ["lorem", "ipsum", "dolor", "sit", "amet"]
+    rng = random.Random(prompt)
+    text = []
+    size = 0
+    while size < ANSWER_BYTES:
+        word = rng.choice(words)
+        text.append(word)
+        size += len(word) + 1
+    return " ".join(text)[:ANSWER_BYTES]
+
+
+def payload(text: str, prompt: str) -> dict:
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {"totalTokenCount": (len(prompt) + len(text)) // 4},
+    }
+
+
+async def simulate_latency():
+    await asyncio.sleep(max(0.0, LATENCY + random.uniform(-JITTER, JITTER)))
+
+
+def error_response():
+    counts["errors"] += 1
+    headers = {"Retry-After": "1"} if ERROR_STATUS == 429 else {}
+    return JSONResponse({"error": {"code": ERROR_STATUS, "message": "Injected failure"}}, ERROR_STATUS, headers)
+
+
+@app.post("/models/{target}")
+async def generate(target: str, request: Request):
+    counts["requests"] += 1
+    body = await request.json()
+    prompt = "".join(part.get("text", "") for part in body["contents"][-1]["parts"])
+    await simulate_latency()
+    if random.random() < ERROR_RATE:
+        return error_response()
+    answer = make_answer(prompt)
+    if not target.endswith(":streamGenerateContent"):
+        return payload(answer, prompt)
+
+    counts["streams"] += 1
+    step = max(1, -(-len(answer) // max(1, STREAM_CHUNKS)))
+
+    async def events():
+        for start in range(0, len(answer), step):
+            if start:
+                await asyncio.sleep(CHUNK_DELAY)
+            yield f"data: {json.dumps(payload(answer[start:start + step], prompt))}\r\n\r\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return counts
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--jitter", type=float, default=JITTER)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--error-status", type=int, default=ERROR_STATUS)
+    parser.add_argument("--answer-bytes", type=int, default=ANSWER_BYTES)
+    parser.add_argument("--stream-chunks", type=int, default=STREAM_CHUNKS)
+    parser.add_argument("--chunk-delay", type=float, default=CHUNK_DELAY)
+    args = parser.parse_args()
+    LATENCY, JITTER, ERROR_RATE, ERROR_STATUS = args.latency, args.jitter, args.error_rate, args.error_status
+    ANSWER_BYTES, STREAM_CHUNKS, CHUNK_DELAY = args.answer_bytes, args.stream_chunks, args.chunk_delay
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,104 @@
+# backend/file_index.py
+import asyncio
+import os
+import threading
+
+SORT_KEYS = {
+    "name": lambda entry: entry[0],
+    "mtime": lambda entry: entry[2],
+    "size": lambda entry: entry[1],
+}
+
+
+class FileIndex:
+    """
+    In-memory listing of the stored files: name -> (size, mtime, digest).
+
+    Built once from the blob store's name index, then kept current by the
+    file endpoints via set()/remove(). When the 'watchfiles' package is
+    available, a watcher reports files dropped into the directory from
+    outside the API so they can be imported. Sorted views are cached until
+    the next change.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries = {}
+        self._sorted = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = None
+        self.version = None  # Last file_changes version applied (multi-process mode)
+
+    def build(self, entries):
+        """ Replaces the index with (name, size, mtime, digest) entries. """
+        with self._lock:
+            self._entries = {name: (size, mtime, digest) for name, size, mtime, digest in entries}
+            self._sorted.clear()
+
+    def set(self, name: str, size: int, mtime: float, digest: str):
+        with self._lock:
+            self._entries[name] = (size, mtime, digest)
+            self._sorted.clear()
+
+    def remove(self, name: str):
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self._sorted.clear()
+
+    def get(self, name: str):
+        """ Returns (size, mtime, digest) for an indexed file, or None. """
+        return self._entries.get(name)
+
+    def items(self) -> list:
+        """ Snapshot of (name, size, mtime, digest) for every file. """
+        with self._lock:
+            return [(name, *entry) for name, entry in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def list(self, sort: str = "name", descending: bool = False, prefix: str = "",
+             offset: int = 0, limit: int = None):
+        """ Returns (total_matching, [(name, size, mtime), ...]) for one page. """
+        with self._lock:
+            view = self._sorted.get((sort, descending))
+            if view is None:
+                view = sorted(
+                    ((name, size, mtime) for name, (size, mtime, _) in self._entries.items()),
+                    key=SORT_KEYS[sort],
+                    reverse=descending,
+                )
+                self._sorted[(sort, descending)] = view
+        if prefix:
+            view = [entry for entry in view if entry[0].startswith(prefix)]
+        end = None if limit is None else offset + limit
+        return len(view), view[offset:end]
+
+    async def start_watching(self, on_change):
+        """ Calls on_change(name) for every top-level, non-hidden path that changes on disk. """
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            print("watchfiles not installed; file index only tracks changes made through the API.")
+            return
+        self._stop = asyncio.Event()
+        self._watcher = asyncio.create_task(self._watch(awatch(self.directory, stop_event=self._stop), on_change))
+
+    async def _watch(self, changes_iter, on_change):
+        directory = os.path.abspath(self.directory)
+        async for changes in changes_iter:
+            for _, path in changes:
+                if os.path.dirname(os.path.abspath(path)) != directory or os.path.basename(path).startswith("."):
+                    continue  # Blob writes under .objects/ and temp files
+                try:
+                    await on_change(os.path.basename(path))
+                except Exception as e:
+                    print(f"Error handling change to {path}: {e}")
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            # The watcher blocks in a worker thread; the stop event lets it exit cleanly
+            self._stop.set()
+            await self._watcher
+            self._watcher = None
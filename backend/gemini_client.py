@@ -0,0 +1,159 @@
+# backend/gemini_client.py
+import asyncio
+import json
+
+import httpx
+
+from rate_limiter import INTERACTIVE, retry_delay
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _http2_available():
+    # httpx only speaks HTTP/2 when the optional 'h2' package is installed.
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def extract_text(response_data: dict) -> str:
+    """ Pulls the answer text out of a Gemini generateContent payload. """
+    if (candidates := response_data.get('candidates')) and \
+       (content := candidates[0].get('content')) and \
+       (parts := content.get('parts')):
+        return "".join(part.get("text", "") for part in parts)
+    return ""
+
+
+def _request_body(prompt: str) -> dict:
+    return {
+        "contents": [{
+            "parts": [{"text": prompt}]
+        }],
+    }
+
+
+class GeminiClient:
+    """
+    Async Gemini client sharing one keep-alive connection pool.
+
+    When given a RateLimiter, every attempt first waits for budget in its
+    priority lane. 429/5xx responses and transport errors are retried up to
+    max_retries times, honoring Retry-After and otherwise backing off
+    exponentially with jitter.
+    """
+
+    def __init__(self, api_key: str, model: str = "gemini-1.5-flash", base_url: str = GEMINI_BASE_URL,
+                 pool_size: int = 100, keepalive: int = 20,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 limiter=None, max_retries: int = 3, backoff_base: float = 1.0, backoff_cap: float = 30.0,
+                 expected_output_tokens: int = 1000, on_status=None):
+        self.api_key = api_key
+        self.on_status = on_status  # Called with each response's status code, or "transport_error"
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.expected_output_tokens = expected_output_tokens
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=keepalive)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("GeminiClient is not started.")
+        return self._client
+
+    def url(self, method: str) -> str:
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=_http2_available(),
+                # Sent as a header so the key never shows up in logged URLs or error details
+                headers={'Content-Type': 'application/json', 'x-goog-api-key': self.api_key},
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def estimate_tokens(self, prompt: str) -> int:
+        # Roughly four characters per token, plus room for the answer
+        return len(prompt) // 4 + self.expected_output_tokens
+
+    async def _send(self, request: httpx.Request, estimated_tokens: int, priority: int) -> httpx.Response:
+        """ Sends a (streaming) request with rate limiting and retries; the caller closes the response. """
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire(estimated_tokens, priority)
+            try:
+                response = await self.client.send(request, stream=True)
+            except httpx.TransportError as e:
+                if self.on_status is not None:
+                    self.on_status("transport_error")
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_delay(attempt, self.backoff_base, self.backoff_cap)
+                print(f"Gemini request failed ({e!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if self.on_status is not None:
+                self.on_status(response.status_code)
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await response.aclose()
+                delay = retry_delay(attempt, self.backoff_base, self.backoff_cap, response.headers.get("retry-after"))
+                if response.status_code == 429 and self.limiter is not None:
+                    self.limiter.throttle(delay)
+                print(f"Gemini returned {response.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+            if self.limiter is not None:
+                self.limiter.record_success()
+            return response
+
+    async def generate(self, prompt: str, priority: int = INTERACTIVE) -> dict:
+        """ Calls generateContent and returns the decoded JSON body. """
+        estimated = self.estimate_tokens(prompt)
+        request = self.client.build_request("POST", self.url("generateContent"), json=_request_body(prompt))
+        response = await self._send(request, estimated, priority)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        data = response.json()
+        if self.limiter is not None and (used := data.get("usageMetadata", {}).get("totalTokenCount")):
+            self.limiter.record_usage(estimated, used)
+        return data
+
+    async def stream(self, prompt: str, priority: int = INTERACTIVE):
+        """ Calls streamGenerateContent over SSE and yields text chunks as they arrive. """
+        params = {"alt": "sse"}
+        request = self.client.build_request(
+            "POST", self.url("streamGenerateContent"), params=params, json=_request_body(prompt)
+        )
+        response = await self._send(request, self.estimate_tokens(prompt), priority)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if not payload:
+                    continue
+                if text := extract_text(json.loads(payload)):
+                    yield text
+        finally:
+            await response.aclose()
@@ -1,27 +1,220 @@
 #!/home/jack/Desktop/reactjs-learning-assistant/backend/venv/bin/python
 # backend/main.py
 import os
-from fastapi import FastAPI, HTTPException, Request, status
+import json
+import time
+import random
+import logging
+import asyncio
+import base64
+import hashlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse as RawFileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import sys
-from Gemini_key import API_KEY
-import requests
+import httpx
+from gemini_client import GEMINI_BASE_URL, GeminiClient, extract_text
+from rate_limiter import BATCH, INTERACTIVE, RateLimiter
+from answer_cache import AnswerCache, cache_key
+from vector_store import VectorStore
+from semantic_cache import SemanticCache
+from retrieval import FileRetrieval
+from singleflight import SingleFlight
+from database import Database
+from write_behind import WriteBehindQueue
+from file_index import FileIndex
+from blob_store import BlobStore
+from metrics import Registry
+from content_encoding import CompressionMiddleware, FastJSONResponse, negotiate
+from file_lock import FileLock
+from conversations import (
+    SESSION_TEMPLATE, SUMMARY_TEMPLATE, ConversationStore, count_tokens, format_turns, recent_turns, turns_to_compact,
+)
 # --- Configuration ---
 load_dotenv()
 
-GEMINI_API_KEY = API_KEY
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-DATABASE_FILE = "learning_history.db"
-FILES_DIR = "files"  # Directory to store text files
-os.makedirs(FILES_DIR, exist_ok=True) # Ensure the directory exists
+def detect_workers() -> int:
+    """
+    Worker processes the server runs: WEB_CONCURRENCY if set, else the --workers/-w
+    option of the uvicorn, gunicorn or hypercorn command line, which every worker
+    inherits as sys.argv.
+    """
+    if env := os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(env))
+    if not any(server in sys.argv[0] for server in ("uvicorn", "gunicorn", "hypercorn")):
+        return 1
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg in ("--workers", "-w") and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.partition("=")[2]
+        elif arg.startswith("-w") and arg[2:].isdigit():
+            value = arg[2:]
+        else:
+            continue
+        try:
+            return max(1, int(value))
+        except ValueError:
+            return 1
+    return 1
+
+# With more than one worker the memory answer cache is off, the Gemini quota is split
+# between workers and the vector features need a Chroma server. Set WEB_CONCURRENCY when
+# the count comes from a config file rather than the command line.
+WORKERS = detect_workers()
+MULTI_PROCESS = WORKERS > 1 or os.getenv("MULTI_PROCESS", "0") == "1"
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", GEMINI_BASE_URL)  # Point at a stand-in server for benchmarks
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "100"))  # Max concurrent upstream connections
+GEMINI_KEEPALIVE = int(os.getenv("GEMINI_KEEPALIVE", "20"))  # Idle connections kept open for reuse
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))  # Requests per minute allowed by the Gemini quota
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))  # Tokens per minute allowed by the Gemini quota
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))  # Retries on 429/5xx and connection errors
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))  # Seconds; doubles per attempt, with jitter
+GEMINI_BACKOFF_CAP = float(os.getenv("GEMINI_BACKOFF_CAP", "30"))
+GEMINI_DEBUG_SAMPLE_RATE = float(os.getenv("GEMINI_DEBUG_SAMPLE_RATE", "0.01"))  # Share of raw responses logged at DEBUG
+GEMINI_DEBUG_MAX_CHARS = int(os.getenv("GEMINI_DEBUG_MAX_CHARS", "2000"))  # Logged raw responses are cut to this size
+# Answers kept in memory. Off by default with several workers: an edit in one process
+# can't evict another's copy, so they all read the shared SQLite tier instead.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "0" if MULTI_PROCESS else "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # Seconds before a memory entry expires
+# Chroma's embedded client is single-process: with several workers the vector features
+# (semantic cache, retrieval) need a shared Chroma server and are off without one.
+CHROMA_URL = os.getenv("CHROMA_URL", "")  # e.g. http://localhost:8001 for a 'chroma run' server; empty uses SEMANTIC_CACHE_DIR
+VECTOR_FEATURES_ALLOWED = not MULTI_PROCESS or bool(CHROMA_URL)
+SEMANTIC_CACHE_ENABLED = VECTOR_FEATURES_ALLOWED and os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))  # Minimum cosine similarity for a hit
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", "chroma_db")  # Persistent vector index location (cache and retrieval)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+RETRIEVAL_ENABLED = VECTOR_FEATURES_ALLOWED and os.getenv("RETRIEVAL_ENABLED", "1") == "1"  # Add passages from files/ to prompts
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))  # Passages added per question
+RETRIEVAL_MIN_SIMILARITY = float(os.getenv("RETRIEVAL_MIN_SIMILARITY", "0.35"))  # Weaker matches are left out
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1200"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "200"))  # Must be less than RETRIEVAL_CHUNK_CHARS
+PROMPT_TEMPLATE = "In the context of ReactJS and FastAPI, please explain the following clearly and concisely. Give examples when appropriate:\n\n{question}"
+# Used instead of PROMPT_TEMPLATE when the files/ corpus has relevant passages
+RETRIEVAL_PROMPT_TEMPLATE = "In the context of ReactJS and FastAPI, please explain the following clearly and concisely. Give examples when appropriate. These excerpts from the course notes may help; build on them where relevant instead of repeating them:\n\n{passages}\n\nQuestion: {question}"
+DATABASE_FILE = os.getenv("DATABASE_FILE", "learning_history.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # Database threads, each with its own connection
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "20000"))  # SQLite page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))  # Answers saved per transaction
+PERSIST_BATCH_DELAY = float(os.getenv("PERSIST_BATCH_DELAY", "0.05"))  # Seconds to gather a burst
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))  # Callers wait when this many are pending
+HISTORY_PAGE_MAX = 500  # Largest page /api/history will return
+FILES_PAGE_MAX = 1000  # Largest page /api/files will return
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # Smaller responses are sent uncompressed
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")  # Preference order; br/zstd need brotli/zstandard
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 0-11; higher is smaller but much slower
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+BATCH_ASK_CONCURRENCY = int(os.getenv("BATCH_ASK_CONCURRENCY", "8"))  # Gemini calls in flight per batch
+BATCH_ASK_MAX_CONCURRENCY = int(os.getenv("BATCH_ASK_MAX_CONCURRENCY", "32"))
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3000"))  # Max context tokens sent with a follow-up
+CONVERSATION_SUMMARY_WORDS = int(os.getenv("CONVERSATION_SUMMARY_WORDS", "250"))  # Target length of a session summary
+EXPORT_BATCH_SIZE = 500  # Rows/files read per step while streaming an export
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))  # Records written per import transaction
+HISTORY_DEDUP_BATCH = int(os.getenv("HISTORY_DEDUP_BATCH", "500"))  # Old history rows folded per compaction transaction
+HISTORY_DEDUP_PAUSE = float(os.getenv("HISTORY_DEDUP_PAUSE", "0.05"))  # Seconds between compaction batches, so writers get in
+FILES_DIR = os.getenv("FILES_DIR", "files")  # Directory to store text files; created during warm-up
+file_index = FileIndex(FILES_DIR)  # Name/size/mtime/hash of every file, so listing doesn't touch the disk
+
+def load_gemini_api_key() -> str:
+    """ GEMINI_API_KEY from the environment, else API_KEY from Gemini_key.py. Read during warm-up, not at import. """
+    if key := os.getenv("GEMINI_API_KEY"):
+        return key
+    try:
+        from Gemini_key import API_KEY
+    except ImportError:
+        return ""
+    return API_KEY
+
+# --- Lifespan ---
+# Importing this module only defines things; all I/O happens in warm_up() and the
+# background warm-up task, both started by the lifespan handler (see Warm-up below).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up()
+    app.state.background_warm_up = asyncio.create_task(warm_up_background())
+    app.state.history_dedup = asyncio.create_task(compact_history_duplicates())
+    try:
+        yield
+    finally:
+        await shut_down(app.state.background_warm_up, app.state.history_dedup)
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="ReactJS Learning Assistant API",
     description="API to interact with Gemini and ChromaDB for learning ReactJS.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+)
+
+# --- Metrics ---
+# Served in Prometheus text format from /metrics.
+logger = logging.getLogger("learning_assistant")
+registry = Registry()
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time to produce a response (headers for streams), by route.",
+    ["method", "route", "status"],
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "Requests currently being handled.")
+ask_stage_seconds = registry.histogram(
+    "ask_stage_duration_seconds", "Time spent in each stage of the ask pipeline.", ["stage"],
+)
+gemini_responses = registry.counter("gemini_responses_total", "Upstream Gemini responses by status code.", ["status"])
+gemini_in_flight = registry.gauge("gemini_requests_in_flight", "Gemini calls currently in progress.")
+db_query_seconds = registry.histogram("db_query_duration_seconds", "Database helper run time, queueing included.", ["query"])
+compressed_responses = registry.counter("http_compressed_responses_total", "Responses sent compressed, by content coding.", ["encoding"])
+compression_bytes = registry.counter("http_compression_bytes_total", "Body bytes before and after compression.", ["encoding", "stage"])
+registry.counter(
+    "answer_cache_lookups_total", "Answer cache lookups by result.", ["result"],
+    callback=lambda: {
+        "memory_hit": answer_cache.hits["memory"],
+        "persistent_hit": answer_cache.hits["persistent"],
+        "semantic_hit": semantic_cache.hits,
+        "miss": answer_cache.misses,
+        "bypass": answer_cache.bypassed,
+    },
+)
+registry.gauge("answer_cache_hit_ratio", "Exact-match cache hit ratio since startup.", callback=lambda: answer_cache.stats()["hit_ratio"])
+registry.gauge("answer_cache_entries", "Answers held in the in-memory cache.", callback=lambda: answer_cache.stats()["entries"])
+registry.gauge("singleflight_in_flight", "Distinct questions with a Gemini call in flight.", callback=lambda: inflight.stats()["in_flight"])
+registry.gauge("gemini_limiter_queued", "Callers waiting for Gemini rate-limit budget.", callback=lambda: gemini_limiter.stats()["queued"])
+registry.gauge("persistence_queue_depth", "Answers and cache-hit counts waiting to be written.", callback=lambda: persistence.depth)
+registry.gauge("reindex_queue_depth", "Changed files waiting to be re-embedded.", callback=lambda: reindex_queue.depth)
+
+def log_gemini_response(response_data: dict):
+    """ Logs a sample of raw Gemini responses, cut to GEMINI_DEBUG_MAX_CHARS, at DEBUG level. """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < GEMINI_DEBUG_SAMPLE_RATE:
+        logger.debug("Gemini raw response (sampled): %s", json.dumps(response_data)[:GEMINI_DEBUG_MAX_CHARS])
+
+# Interactive asks queue ahead of batch work for the shared Gemini quota.
+# The quota is per API key, so each worker process gets an equal share of it.
+gemini_limiter = RateLimiter(GEMINI_RPM / WORKERS, GEMINI_TPM / WORKERS)
+gemini = GeminiClient(
+    "",  # Set by warm_up() from load_gemini_api_key()
+    model=GEMINI_MODEL,
+    base_url=GEMINI_API_URL,
+    pool_size=GEMINI_POOL_SIZE,
+    keepalive=GEMINI_KEEPALIVE,
+    connect_timeout=GEMINI_CONNECT_TIMEOUT,
+    read_timeout=GEMINI_READ_TIMEOUT,
+    limiter=gemini_limiter,
+    max_retries=GEMINI_MAX_RETRIES,
+    backoff_base=GEMINI_BACKOFF_BASE,
+    backoff_cap=GEMINI_BACKOFF_CAP,
+    on_status=lambda status: gemini_responses.inc(status=status),
 )
 
 # --- CORS Configuration ---
@@ -37,20 +230,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified", "Content-Range"],
+)
+
+# --- Response Compression ---
+def record_compression(encoding: str, original: int, sent: int):
+    compressed_responses.inc(encoding=encoding)
+    compression_bytes.inc(original, encoding=encoding, stage="original")
+    compression_bytes.inc(sent, encoding=encoding, stage="sent")
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_BYTES,
+    encodings=[coding.strip() for coding in COMPRESSION_ENCODINGS],
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    zstd_level=COMPRESSION_ZSTD_LEVEL,
+    on_compress=record_compression,
 )
 
 # --- Pydantic Models ---
 class AskRequest(BaseModel):
     question: str
+    no_cache: bool = False  # Skip the answer cache and always ask Gemini
+    session_id: Optional[str] = None  # Answer as a follow-up in this conversation (see /api/sessions)
 
 class AskResponse(BaseModel):
     answer: str
+    cached: bool = False
+
+class BatchAskRequest(BaseModel):
+    questions: list[str] = Field(..., min_length=1, max_length=500)
+    concurrency: Optional[int] = Field(None, ge=1)  # Defaults to BATCH_ASK_CONCURRENCY
+    no_cache: bool = False
 
 class HistoryItem(BaseModel):
     id: int
-    timestamp: str
+    timestamp: str  # First time this question/answer pair was saved
     question: str
     answer: str
+    ask_count: int = 1  # Times the same pair was saved; repeats bump this instead of adding rows
+    last_asked: Optional[str] = None
 
 class FileCreateRequest(BaseModel):
     filename: str
@@ -68,30 +288,64 @@ class MessageResponse(BaseModel):
 
 class FileInfo(BaseModel):
     filename: str
+    size: Optional[int] = None
+    modified: Optional[float] = None  # Unix timestamp of the last modification
 
 
 class HistoryItemUpdate(BaseModel):
     question: str
     answer: str
 
+class HistorySearchResult(BaseModel):
+    id: int
+    timestamp: str
+    question: str  # Highlighted with <mark> tags
+    snippet: str  # Best-matching excerpt of the answer
+    rank: float
+
+class HistorySearchResponse(BaseModel):
+    query: str
+    results: list[HistorySearchResult]
+    next_offset: Optional[int] = None
+
+class SessionCreated(BaseModel):
+    session_id: str
+
+class SessionTurn(BaseModel):
+    id: int
+    timestamp: str
+    question: str
+    answer: str
+
+class SessionDetail(BaseModel):
+    session_id: str
+    created: str
+    updated: str
+    summary: str  # Rolling summary of the turns no longer sent verbatim
+    turns: list[SessionTurn]
+
 class VideoIdResponse(BaseModel):
     video_id: str
 
-# --- Database Helper Functions (Keep these as they are) ---
+# --- Database Helper Functions ---
+# These are blocking; endpoints run them on the database thread pool with 'await db.run(...)'.
 import sqlite3
 from datetime import datetime
 
-def create_connection():
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        return conn
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+db = Database(
+    DATABASE_FILE,
+    pool_size=DB_POOL_SIZE,
+    busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+    cache_size_kib=DB_CACHE_SIZE_KIB,
+    mmap_size=DB_MMAP_SIZE,
+    on_query=lambda name, seconds: db_query_seconds.observe(seconds, query=name),
+)
+# Saved answers are stored once per distinct content, gzip-compressed, under files/.objects/.
+file_store = BlobStore(FILES_DIR, db)
+conversations = ConversationStore(db)
 
 def create_history_table():
-    conn = create_connection()
+    conn = db.connect()
     try:
         cursor = conn.cursor()
         cursor.execute("""
@@ -102,44 +356,538 @@ def create_history_table():
                 answer TEXT NOT NULL
             )
         """)
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(history)")]
+        if "cache_key" not in columns:
+            cursor.execute("ALTER TABLE history ADD COLUMN cache_key TEXT")
+        if "content_hash" not in columns:
+            # Rows from before deduplication keep a NULL hash until compact_history_duplicates() folds them
+            cursor.execute("ALTER TABLE history ADD COLUMN content_hash TEXT")
+            cursor.execute("ALTER TABLE history ADD COLUMN ask_count INTEGER NOT NULL DEFAULT 1")
+            cursor.execute("ALTER TABLE history ADD COLUMN last_asked DATETIME")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_cache_key ON history (cache_key)")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_history_content_hash ON history (content_hash)")
+        # Serves ORDER BY timestamp DESC, id DESC and the keyset cursor without a sort
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp_id ON history (timestamp, id)")
+        create_history_search_index(cursor)
+        # Backfill keys for rows saved before the answer cache existed
+        rows = cursor.execute("SELECT id, question FROM history WHERE cache_key IS NULL").fetchall()
+        cursor.executemany(
+            "UPDATE history SET cache_key = ? WHERE id = ?",
+            [(cache_key(question, PROMPT_TEMPLATE), row_id) for row_id, question in rows],
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def create_history_search_index(cursor):
+    """ FTS5 mirror of history.question/answer, kept in sync by triggers. """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+    exists = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+            question, answer, content='history', content_rowid='id', tokenize='porter unicode61'
+        )
+    """)
+    cursor.executescript("""
+        CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF question, answer ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+            INSERT INTO history_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+        END;
+    """)
+    if not exists:
+        # Index the rows saved before the search table existed
+        cursor.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+def fts_query(text: str) -> str:
+    """ Turns free text into an FTS5 query: every word must match, a trailing '*' keeps prefix search. """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def search_history(query: str, limit: int, offset: int):
+    cursor = db.connect().cursor()
+    cursor.execute("""
+        SELECT h.id, h.timestamp,
+               highlight(history_fts, 0, '<mark>', '</mark>'),
+               snippet(history_fts, 1, '<mark>', '</mark>', '…', 24),
+               bm25(history_fts, 2.0, 1.0) AS rank
+        FROM history_fts JOIN history h ON h.id = history_fts.rowid
+        WHERE history_fts MATCH ?
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """, (query, limit, offset))
+    return [
+        {"id": row[0], "timestamp": row[1], "question": row[2], "snippet": row[3], "rank": row[4]}
+        for row in cursor.fetchall()
+    ]
+
+def count_cached_asks(keys: list):
+    """
+    Credits asks answered from a cache (one cache key per ask, repeats allowed)
+    to the latest history row for each key: ask_count and last_asked.
+    """
+    conn = db.connect()
+    try:
+        conn.executemany(
+            """
+            UPDATE history SET ask_count = ask_count + ?, last_asked = CURRENT_TIMESTAMP
+            WHERE id = (SELECT MAX(id) FROM history WHERE cache_key = ?)
+            """,
+            [(count, key) for key, count in Counter(keys).items()],
+        )
         conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def history_hash(question: str, answer: str) -> str:
+    """ Identity of a question/answer pair; history holds one row per hash. """
+    return hashlib.sha256(f"{question}\0{answer}".encode("utf-8")).hexdigest()
+
+def save_question_answers(items: list):
+    """
+    Saves (question, answer, template) items in a single transaction. A pair
+    already in history bumps that row's ask_count and last_asked instead of
+    adding a row.
+    """
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO history (question, answer, cache_key, content_hash, last_asked)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (content_hash) DO UPDATE SET ask_count = ask_count + 1, last_asked = excluded.last_asked
+            """,
+            [(question, answer, cache_key(question, template), history_hash(question, answer)) for question, answer, template in items],
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def fetch_history_batch(after_id: int, limit: int):
+    cursor = db.connect().cursor()
+    cursor.execute(
+        "SELECT id, timestamp, question, answer, ask_count, COALESCE(last_asked, timestamp) FROM history WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit),
+    )
+    return cursor.fetchall()
+
+def import_history_rows(rows: list):
+    """
+    Saves (timestamp, question, answer, ask_count, last_asked) rows, any of the
+    timestamps None, in a single transaction. A pair already in history keeps
+    the larger ask_count and the wider first/last asked times, so importing the
+    same archive again (or retrying a failed import) changes nothing.
+    """
+    conn = db.connect()
+    try:
+        conn.executemany(
+            """
+            INSERT INTO history (timestamp, question, answer, cache_key, content_hash, ask_count, last_asked)
+            VALUES (COALESCE(?1, CURRENT_TIMESTAMP), ?2, ?3, ?4, ?5, ?6, COALESCE(?7, ?1, CURRENT_TIMESTAMP))
+            ON CONFLICT (content_hash) DO UPDATE SET
+                ask_count = MAX(ask_count, excluded.ask_count),
+                timestamp = MIN(timestamp, excluded.timestamp),
+                last_asked = MAX(COALESCE(last_asked, timestamp), excluded.last_asked)
+            """,
+            [
+                (timestamp, question, answer, cache_key(question, PROMPT_TEMPLATE), history_hash(question, answer), ask_count, last_asked)
+                for timestamp, question, answer, ask_count, last_asked in rows
+            ],
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def encode_history_cursor(timestamp: str, item_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}|{item_id}".encode()).decode()
+
+def decode_history_cursor(cursor_value: str):
+    """ Returns (timestamp, id) from a cursor made by encode_history_cursor. """
+    try:
+        timestamp, item_id = base64.urlsafe_b64decode(cursor_value.encode()).decode().rsplit("|", 1)
+        return timestamp, int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid history cursor.")
+
+def fetch_history(limit: int = None, before: tuple = None):
+    """
+    Returns (items, next_cursor), newest first, as HistoryItem-shaped dicts.
+
+    With a limit, at most that many rows strictly older than the 'before'
+    (timestamp, id) position are read; next_cursor is None on the last page.
+    """
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        query = "SELECT id, timestamp, question, answer, ask_count, COALESCE(last_asked, timestamp) FROM history"
+        params = []
+        if before is not None:
+            query += " WHERE (timestamp, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)  # One extra row tells us whether another page exists
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1][1], rows[-1][0])
+        return [
+            {"id": row[0], "timestamp": row[1], "question": row[2], "answer": row[3], "ask_count": row[4], "last_asked": row[5]}
+            for row in rows
+        ], next_cursor
     except sqlite3.Error as e:
         print(e)
-    finally:
-        if conn:
-            conn.close()
+        return [], None
 
-def save_question_answer(question: str, answer: str):
-    conn = create_connection()
+def fetch_cached_answers(keys: list) -> dict:
+    """ {cache_key: latest answer} for those of 'keys' that history has, in one query. """
+    placeholders = ", ".join("?" * len(keys))
+    conn = db.connect()
     try:
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO history (question, answer) VALUES (?, ?)", (question, answer))
-        conn.commit()
+        cursor.execute(
+            f"""
+            SELECT cache_key, answer FROM history
+            WHERE id IN (SELECT MAX(id) FROM history WHERE cache_key IN ({placeholders}) GROUP BY cache_key)
+            """,
+            keys,
+        )
+        return dict(cursor.fetchall())
     except sqlite3.Error as e:
         print(e)
-    finally:
-        if conn:
-            conn.close()
+        return {}
+
+# --- Answer Cache ---
+# In-process LRU in front of the history table, keyed on the normalized question and prompt template.
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL,
+    persistent_lookup=lambda keys: db.run(fetch_cached_answers, keys),
+)
+# One embedding model and Chroma client serve both the semantic cache and file retrieval.
+vector_store = VectorStore(SEMANTIC_CACHE_DIR, model_name=EMBEDDING_MODEL, url=CHROMA_URL or None)
+# Serializes index catch-up and retrieval re-embedding across threads and workers
+vector_write_lock = FileLock(DATABASE_FILE + ".vector.lock")
+# Paraphrased questions fall through to the nearest prior question in a local vector index.
+semantic_cache = SemanticCache(vector_store, threshold=SEMANTIC_CACHE_THRESHOLD)
+# Chunks of every file in files/, re-embedded per file as files change (see reindex_queue).
+file_retrieval = FileRetrieval(
+    vector_store,
+    chunk_chars=RETRIEVAL_CHUNK_CHARS,
+    overlap=RETRIEVAL_CHUNK_OVERLAP,
+    min_similarity=RETRIEVAL_MIN_SIMILARITY,
+)
 
-def fetch_history():
-    conn = create_connection()
+def fetch_semantic_backfill():
+    """ Latest answer for every distinct cache key, used to seed an empty vector index. """
+    conn = db.connect()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT id, timestamp, question, answer FROM history ORDER BY timestamp DESC")
-        rows = cursor.fetchall()
-        return [HistoryItem(id=row[0], timestamp=row[1], question=row[2], answer=row[3]) for row in rows]
+        cursor.execute("""
+            SELECT h.cache_key, h.question, h.answer FROM history h
+            JOIN (SELECT MAX(id) AS id FROM history GROUP BY cache_key) latest ON latest.id = h.id
+        """)
+        return cursor.fetchall()
     except sqlite3.Error as e:
         print(e)
         return []
-    finally:
-        if conn:
-            conn.close()
+
+def backfill_semantic_cache() -> int:
+    """ Seeds an empty vector index from history; with several workers the first to get the lock does it. """
+    with vector_write_lock:
+        if not semantic_cache.available or not semantic_cache.is_empty():
+            return 0
+        by_template = {}
+        for key, question, answer in db.call(fetch_semantic_backfill):
+            # Rows keyed under a template that has since changed can't be hits; leave them out
+            for template in (PROMPT_TEMPLATE, RETRIEVAL_PROMPT_TEMPLATE):
+                if key == cache_key(question, template):
+                    by_template.setdefault(template, []).append((key, question, answer))
+                    break
+        for template, rows in by_template.items():
+            for start in range(0, len(rows), 256):
+                semantic_cache.add(rows[start:start + 256], template)
+    return sum(len(rows) for rows in by_template.values())
+
+def fetch_history_item(item_id: int):
+    cursor = db.connect().cursor()
+    cursor.execute(
+        "SELECT id, timestamp, question, answer, ask_count, COALESCE(last_asked, timestamp) FROM history WHERE id = ?",
+        (item_id,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return HistoryItem(id=row[0], timestamp=row[1], question=row[2], answer=row[3], ask_count=row[4], last_asked=row[5])
+
+def update_history_row(item_id: int, question: str, answer: str):
+    """
+    Returns (old_cache_key, updated HistoryItem), or (None, None) if the row
+    doesn't exist. Raises sqlite3.IntegrityError if another row already holds
+    the edited pair.
+    """
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT cache_key FROM history WHERE id = ?", (item_id,))
+        old_key = cursor.fetchone()
+        cursor.execute(
+            "UPDATE history SET question=?, answer=?, cache_key=?, content_hash=? WHERE id=?",
+            (question, answer, cache_key(question, PROMPT_TEMPLATE), history_hash(question, answer), item_id),
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    if cursor.rowcount == 0:
+        return None, None
+    return old_key[0], fetch_history_item(item_id)
+
+# --- History Deduplication ---
+# Rows saved before content_hash existed have it NULL (allowed by the unique index).
+# compact_history_duplicates() hashes them in short transactions once per startup,
+# folding each duplicate into the row that already holds its hash; a no-op once done.
+history_rows_folded = registry.counter("history_rows_folded_total", "Duplicate history rows folded into an earlier copy.")
+
+def compact_history_batch(limit: int):
+    """ Hashes up to 'limit' unhashed rows, oldest first; returns (rows seen, rows folded). """
+    conn = db.connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # Read and fold under one write lock, so workers can't interleave
+        rows = conn.execute(
+            "SELECT id, timestamp, question, answer, ask_count, COALESCE(last_asked, timestamp) FROM history "
+            "WHERE content_hash IS NULL ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        folded = 0
+        for row_id, timestamp, question, answer, ask_count, last_asked in rows:
+            digest = history_hash(question, answer)
+            keeper = conn.execute("SELECT id FROM history WHERE content_hash = ?", (digest,)).fetchone()
+            if keeper is None:
+                conn.execute("UPDATE history SET content_hash = ?, last_asked = ? WHERE id = ?", (digest, last_asked, row_id))
+                continue
+            conn.execute(
+                """
+                UPDATE history SET ask_count = ask_count + ?, timestamp = MIN(timestamp, ?),
+                    last_asked = MAX(COALESCE(last_asked, timestamp), ?)
+                WHERE id = ?
+                """,
+                (ask_count, timestamp, last_asked, keeper[0]),
+            )
+            conn.execute("DELETE FROM history WHERE id = ?", (row_id,))
+            folded += 1
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(rows), folded
+
+async def compact_history_duplicates():
+    """ Online: HISTORY_DEDUP_BATCH rows per transaction with a pause between, so asks keep saving meanwhile. """
+    seen = folded = 0
+    try:
+        while True:
+            batch_seen, batch_folded = await db.run(compact_history_batch, HISTORY_DEDUP_BATCH)
+            seen += batch_seen
+            folded += batch_folded
+            history_rows_folded.inc(batch_folded)
+            if batch_seen < HISTORY_DEDUP_BATCH:
+                break
+            await asyncio.sleep(HISTORY_DEDUP_PAUSE)
+    except sqlite3.Error as e:
+        print(f"History deduplication stopped after {seen} rows: {e}")
+        return
+    if seen:
+        print(f"History deduplication: hashed {seen} older rows, folded {folded} duplicates.")
+
+# Identical questions in flight at the same time are answered by a single upstream call.
+inflight = SingleFlight()
+
+# --- Warm-up ---
+# warm_up() runs the cheap stages every endpoint needs before the server accepts
+# requests; slow ones (embedding model load, semantic backfill, file watcher)
+# continue in the background. /health is liveness, /ready turns 200 once every
+# stage has finished.
+warm_up_stages = {}  # stage -> {"state": pending|running|done|skipped|failed, "seconds": float}
+
+async def run_stage(stage: str, fn):
+    warm_up_stages[stage] = {"state": "running", "seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        state = await fn()
+    except Exception as e:
+        print(f"Warm-up stage '{stage}' failed: {e}")
+        state = "failed"
+    warm_up_stages[stage] = {"state": state or "done", "seconds": round(time.perf_counter() - start, 4)}
+    return warm_up_stages[stage]["state"]
+
+async def prepare_files_dir():
+    await asyncio.to_thread(os.makedirs, FILES_DIR, exist_ok=True)
+
+def create_schema():
+    # Workers starting together would race on ALTER TABLE and the FTS rebuild
+    with FileLock(DATABASE_FILE + ".lock"):
+        create_history_table()
+        file_store.create_tables()
+        conversations.create_tables()
+
+async def prepare_database():
+    # The first query on each pool thread applies the connection pragmas
+    await db.run(create_schema)
+
+async def start_http_pool():
+    gemini.api_key = load_gemini_api_key()
+    await gemini.start()
+
+async def start_queues():
+    await persistence.start()
+    await reindex_queue.start()
+
+async def build_file_index():
+    if imported := await db.run(file_store.import_plain_files):
+        print(f"Indexed {imported} new or changed plain files into the content-addressed store.")
+    file_index.version = None
+    await sync_file_index()
+
+async def start_file_watcher():
+    await file_index.start_watching(import_dropped_file)
+
+async def load_embedding_model():
+    if not VECTOR_FEATURES_ALLOWED:
+        print("Semantic cache and retrieval are off: several workers need a shared Chroma server (CHROMA_URL).")
+    if not (SEMANTIC_CACHE_ENABLED or RETRIEVAL_ENABLED):
+        return "skipped"
+    if await asyncio.to_thread(vector_store.load):
+        return "done"
+    return "failed" if vector_store.error else "skipped"
+
+async def warm_up_semantic_cache():
+    if not SEMANTIC_CACHE_ENABLED or not semantic_cache.available:
+        return "skipped"
+    if indexed := await asyncio.to_thread(backfill_semantic_cache):
+        print(f"Semantic cache indexed {indexed} questions from history.")
+
+def catch_up_file_retrieval() -> int:
+    """
+    Re-embeds the files added, changed or removed since the retrieval index
+    last saw them. Under the vector lock, so workers starting together take
+    turns and the later ones find nothing left to do.
+    """
+    with vector_write_lock:
+        indexed = file_retrieval.indexed_digests()
+        current = {name: digest for name, _, _, digest in file_index.items()}
+        changed = [name for name, digest in current.items() if indexed.get(name) != digest]
+        changed += [name for name in indexed if name not in current]
+        for start in range(0, len(changed), 64):
+            sync_retrieval_index(changed[start:start + 64])
+    return len(changed)
+
+async def warm_up_file_retrieval():
+    if not RETRIEVAL_ENABLED or not vector_store.available:
+        return "skipped"
+    if changed := await asyncio.to_thread(catch_up_file_retrieval):
+        print(f"Indexed {changed} changed files for retrieval.")
+
+STARTUP_STAGES = [
+    ("files_dir", prepare_files_dir),
+    ("database", prepare_database),
+    ("http_pool", start_http_pool),
+    ("queues", start_queues),
+    ("file_index", build_file_index),
+]
+BACKGROUND_STAGES = [
+    ("file_watcher", start_file_watcher),
+    ("embedding_model", load_embedding_model),
+    ("semantic_backfill", warm_up_semantic_cache),
+    ("file_retrieval", warm_up_file_retrieval),
+]
+for stage, _ in STARTUP_STAGES + BACKGROUND_STAGES:
+    warm_up_stages[stage] = {"state": "pending", "seconds": 0.0}
+
+async def warm_up():
+    for stage, fn in STARTUP_STAGES:
+        if await run_stage(stage, fn) == "failed":
+            raise RuntimeError(f"Warm-up stage '{stage}' failed; not starting.")
+
+async def warm_up_background():
+    for stage, fn in BACKGROUND_STAGES:
+        await run_stage(stage, fn)
+
+async def shut_down(*background_tasks: asyncio.Task):
+    for task in [*background_tasks, *compaction_tasks]:
+        task.cancel()
+    await asyncio.gather(*background_tasks, *compaction_tasks, return_exceptions=True)
+    await gemini.close()
+    await file_index.stop_watching()
+    await reindex_queue.close(drain=False)  # Whatever is left is picked up by the next startup's sync
+    await persistence.close()  # Flush pending answers before the database goes away
+    db.close()
+
+def is_ready() -> bool:
+    # A failed background stage leaves the API degraded (no semantic hits, no watcher), not down
+    return all(info["state"] not in ("pending", "running") for info in warm_up_stages.values())
+
+registry.gauge(
+    "warm_up_stage_seconds", "Time each warm-up stage took.", ["stage"],
+    callback=lambda: {stage: info["seconds"] for stage, info in warm_up_stages.items()},
+)
+registry.gauge("ready", "1 once every warm-up stage has finished.", callback=lambda: int(is_ready()))
 
 # --- API Endpoints ---
 
-@app.on_event("startup")
-async def startup_event():
-    create_history_table()
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    http_in_flight.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        http_in_flight.dec()
+        # Label by route template so /api/files/{filename} is one series, not one per file
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status_code,
+        )
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/health", tags=["General"])
+async def health():
+    """ Liveness: the process is up and serving. """
+    return {"status": "ok"}
+
+@app.get("/ready", tags=["General"])
+async def ready(response: Response):
+    """ Readiness: 200 once warm-up has finished, 503 with per-stage progress until then. """
+    if not is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": is_ready(), "stages": warm_up_stages}
 
 @app.get("/", tags=["General"])
 async def read_root():
@@ -149,135 +897,745 @@ async def read_root():
 async def test_api():
     return {"message": "Hello from Backend API!"}
 
+def build_prompt(question: str, passages: list = ()) -> tuple:
+    """ (template, prompt) for the question; the answer is cached under that template's key. """
+    if not passages:
+        return PROMPT_TEMPLATE, PROMPT_TEMPLATE.format(question=question)
+    excerpts = "\n\n".join(f"[{name}]\n{text}" for name, text, _ in passages)
+    return RETRIEVAL_PROMPT_TEMPLATE, RETRIEVAL_PROMPT_TEMPLATE.format(passages=excerpts, question=question)
+
+def answer_templates() -> list:
+    """ Templates a cached answer to a new question may have been generated with, retrieval first. """
+    if RETRIEVAL_ENABLED and vector_store.available:
+        return [RETRIEVAL_PROMPT_TEMPLATE, PROMPT_TEMPLATE]
+    return [PROMPT_TEMPLATE]
+
+async def retrieve_passages(question: str) -> list:
+    """ Top-k (file, passage, similarity) from files/ for the prompt; [] until the model is loaded. """
+    if not RETRIEVAL_ENABLED or not vector_store.loaded:
+        return []
+    try:
+        with ask_stage_seconds.time(stage="retrieval"):
+            return await asyncio.to_thread(file_retrieval.search, question, RETRIEVAL_TOP_K)
+    except Exception as e:
+        print(f"Error searching files for context: {e}")
+        return []
+
+def answer_filename(question: str) -> str:
+    return question.replace(" ", "_") + ".txt"
+
+def save_answer_files(items: list):
+    """ Saves each question as the filename and its answer as the content. """
+    # Within one batch only the last answer per filename needs to be stored
+    latest = {answer_filename(question): answer for question, answer, _ in items}
+    try:
+        stored = file_store.put_many([(filename, answer, None) for filename, answer in latest.items()])
+    except Exception as e:
+        print(f"Error saving to file: {e}")
+        return
+    for filename, size, mtime, digest in stored:
+        file_index.set(filename, size, mtime, digest)
+        print(f"Saved question and answer to file: {filename}")
+
+async def write_answers(items: list):
+    """
+    Write-behind handler. (question, answer, template) items are new answers for
+    the database, files/ and the vector index; a cache key is an ask answered
+    from the cache, counted once the new answers in the same batch are saved.
+    """
+    answers = [item for item in items if not isinstance(item, str)]
+    if answers:
+        await save_new_answers(answers)
+    if asks := [item for item in items if isinstance(item, str)]:
+        await db.run(count_cached_asks, asks)
+
+async def save_new_answers(items: list):
+    with ask_stage_seconds.time(stage="db_insert"):
+        await db.run(save_question_answers, items)
+    with ask_stage_seconds.time(stage="file_write"):
+        await db.run(save_answer_files, items)
+    await schedule_reindex(*{answer_filename(question) for question, _, _ in items})
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            by_template = {}
+            for question, answer, template in items:
+                by_template.setdefault(template, []).append((cache_key(question, template), question, answer))
+            for template, indexed in by_template.items():
+                await asyncio.to_thread(semantic_cache.add, indexed, template)
+        except Exception as e:
+            print(f"Error indexing questions in semantic cache: {e}")
+
+# Answers are returned as soon as they exist; saving them (and counting cache hits) happens
+# in batches behind the response.
+persistence = WriteBehindQueue(
+    write_answers,
+    max_batch=PERSIST_BATCH_SIZE,
+    max_delay=PERSIST_BATCH_DELAY,
+    max_size=PERSIST_QUEUE_SIZE,
+)
+
+def sync_retrieval_index(names: list):
+    files = []
+    for name in names:
+        entry = file_index.get(name)
+        if entry is None:
+            files.append((name, None, None))
+            continue
+        try:
+            files.append((name, entry[2], file_store.read(entry[2])))
+        except FileNotFoundError:
+            continue  # Replaced since we looked it up; the new version is queued too
+    with vector_write_lock:
+        file_retrieval.sync(files)
+
+async def reindex_files(names: list):
+    """ Reindex handler: re-embeds only the chunks of files that changed, reading their current content. """
+    if RETRIEVAL_ENABLED and vector_store.available:
+        await asyncio.to_thread(sync_retrieval_index, list(dict.fromkeys(names)))
+
+# File writes only queue their name here; embedding runs behind the response, one batch at a time.
+reindex_queue = WriteBehindQueue(reindex_files, max_batch=64, max_delay=0.2, max_size=100000)
+
+async def schedule_reindex(*names: str):
+    if RETRIEVAL_ENABLED and vector_store.available:
+        for name in names:
+            await reindex_queue.submit(name)
+
+async def persist_answer(question: str, answer: str, template: str):
+    # Cache first, so a repeat question is answered before the write lands
+    answer_cache.put(cache_key(question, template), answer)
+    await persistence.submit((question, answer, template))
+
+async def lookup_cached_answer(request: AskRequest):
+    """ Returns a cached answer for the request, or None if it must go to Gemini. """
+    if request.no_cache:
+        answer_cache.bypassed += 1
+        return None
+    templates = answer_templates()
+    with ask_stage_seconds.time(stage="cache_lookup"):
+        hit = await answer_cache.get(*(cache_key(request.question, template) for template in templates))
+    if hit is not None:
+        answer, tier, source_key = hit
+        print(f"Answer cache hit ({tier}) for: {request.question}")
+        await persistence.submit(source_key)
+        return answer
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            with ask_stage_seconds.time(stage="semantic_lookup"):
+                match = await asyncio.to_thread(semantic_cache.lookup, request.question, templates)
+        except Exception as e:
+            print(f"Error querying semantic cache: {e}")
+            match = None
+        if match is not None:
+            answer, similarity, matched_question, template = match
+            print(f"Semantic cache hit ({similarity:.3f}) for: {request.question} -> {matched_question}")
+            source_key = cache_key(matched_question, template)
+            answer_cache.put(cache_key(request.question, template), answer, source_key)
+            await persistence.submit(source_key)
+            return answer
+    return None
+
+def check_gemini_key():
+    if not gemini.api_key:
+        print("ERROR: GEMINI_API_KEY not found in environment variables.")
+        raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key missing.")
+
 @app.post("/api/ask", response_model=AskResponse, tags=["Gemini"])
 async def ask_gemini(request: AskRequest):
     print(f"Received question: {request.question}")
-    if not GEMINI_API_KEY:
-        print("ERROR: GEMINI_API_KEY not found in environment variables.")
-        raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key missing.")
-    headers = {'Content-Type': 'application/json'}
-    prompt = f"In the context of ReactJS and FastAPI, please explain the following clearly and concisely. Give examples when appropriate:\n\n{request.question}"
-    data = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }],
-    }
+    session = await load_session(request.session_id) if request.session_id else None
+    follow_up_prompt = build_session_prompt(session, request.question) if session else None
+    if follow_up_prompt is None and (cached_answer := await lookup_cached_answer(request)) is not None:
+        response = AskResponse(answer=cached_answer, cached=True)
+    else:
+        response = AskResponse(answer=await answer_from_gemini(request, follow_up_prompt))
+    if session is not None:
+        await record_turn(session["id"], request.question, response.answer)
+    return response
+
+async def answer_from_gemini(request: AskRequest, follow_up_prompt: Optional[str]) -> str:
+    check_gemini_key()
+    key = cache_key(request.question, PROMPT_TEMPLATE)
     try:
-        response = requests.post(GEMINI_API_URL, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-        response_data = response.json()
-        print(f"Gemini raw response: {response_data}")
-        if (candidates := response_data.get('candidates')) and \
-           (content := candidates[0].get('content')) and \
-           (parts := content.get('parts')):
-            extracted_text = "".join(part.get("text", "") for part in parts).strip()
-        else:
+        if follow_up_prompt is not None:
+            # The answer depends on the conversation, so it bypasses the shared cache and history
+            answer, _ = await call_gemini(follow_up_prompt)
+            return answer
+        # Concurrent asks for the same question share one Gemini call and one save
+        return await inflight.do(key, lambda: generate_answer(request.question))
+    except httpx.HTTPStatusError as e:
+        print(f"Error calling Gemini API: {e}")
+        if e.response.status_code == 429:
+            # Still over quota after retrying: let the client back off too
+            raise HTTPException(
+                status_code=429,
+                detail="Gemini API quota exceeded, please retry shortly.",
+                headers={"Retry-After": e.response.headers.get("retry-after", str(int(GEMINI_BACKOFF_CAP)))},
+            )
+        raise HTTPException(status_code=503, detail=f"Failed to communicate with Gemini API: {e}")
+    except httpx.HTTPError as e:
+        print(f"Error calling Gemini API: {e}")
+        raise HTTPException(status_code=503, detail=f"Failed to communicate with Gemini API: {e}")
+    except Exception as e:
+        print(f"Unexpected error processing Gemini response: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error processing response: {e}")
+
+async def generate_answer(question: str, priority: int = INTERACTIVE) -> str:
+    """ Asks Gemini, saves the answer and returns its text. """
+    passages = await retrieve_passages(question)
+    with ask_stage_seconds.time(stage="prompt_build"):
+        template, prompt = build_prompt(question, passages)
+    extracted_text, answered = await call_gemini(prompt, priority)
+    if answered:
+        await persist_answer(question, extracted_text, template)
+    else:
+        print(f"Not saving Gemini's non-answer for: {question}")
+    return extracted_text
+
+async def call_gemini(prompt: str, priority: int = INTERACTIVE) -> tuple:
+    """
+    Sends a prompt to Gemini and returns (text, answered). With no answer in the
+    response (blocked, error payload, empty) the text explains why and answered
+    is False, so it is shown but never saved or cached.
+    """
+    gemini_in_flight.inc()
+    try:
+        with ask_stage_seconds.time(stage="upstream"):
+            response_data = await gemini.generate(prompt, priority)
+    finally:
+        gemini_in_flight.dec()
+    log_gemini_response(response_data)
+    with ask_stage_seconds.time(stage="parse"):
+        extracted_text = extract_text(response_data).strip()
+        answered = bool(extracted_text)
+        if not response_data.get('candidates'):
             print("Warning: Could not extract text from Gemini response structure.")
             extracted_text = response_data.get("error", {}).get("message", "Could not parse answer from Gemini.")
         if not extracted_text:
             extracted_text = "Gemini returned an empty answer."
-        print(f"Extracted answer: {extracted_text[:100]}...")
-        save_question_answer(request.question, extracted_text)  # Save to database
+    print(f"Extracted answer: {extracted_text[:100]}...")
+    return extracted_text, answered
 
-        # --- Save question as filename and answer as content ---
-        filename = request.question.replace(" ", "_") + ".txt"
-        filepath = os.path.join(FILES_DIR, filename)
+@app.post("/api/ask/batch", tags=["Gemini"])
+async def ask_gemini_batch(request: BatchAskRequest):
+    """
+    Answers many questions in one call, streamed back as NDJSON in completion order.
+
+    Duplicate questions (after normalization) are asked once, cached answers
+    are served locally, and the rest go to Gemini with at most 'concurrency'
+    calls in flight. New answers are saved through the write-behind queue.
+    """
+    distinct = {}
+    for question in request.questions:
+        distinct.setdefault(cache_key(question, PROMPT_TEMPLATE), question)
+    concurrency = min(request.concurrency or BATCH_ASK_CONCURRENCY, BATCH_ASK_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    print(f"Received batch of {len(request.questions)} questions ({len(distinct)} distinct)")
+
+    async def answer_one(key: str, question: str) -> dict:
+        cached_answer = await lookup_cached_answer(AskRequest(question=question, no_cache=request.no_cache))
+        if cached_answer is not None:
+            return {"question": question, "answer": cached_answer, "cached": True}
         try:
-            with open(filepath, "w") as f:
-                f.write(extracted_text)
-            print(f"Saved question and answer to file: {filename}")
+            async with semaphore:
+                answer = await inflight.do(key, lambda: generate_answer(question, BATCH))
+            return {"question": question, "answer": answer, "cached": False}
+        except httpx.HTTPError as e:
+            print(f"Error calling Gemini API: {e}")
+            return {"question": question, "error": f"Failed to communicate with Gemini API: {e}"}
         except Exception as e:
-            print(f"Error saving to file: {e}")
-            # You might want to handle this error more gracefully,
-            # perhaps by logging it or returning a specific error message to the frontend.
+            print(f"Unexpected error processing Gemini response: {e}")
+            return {"question": question, "error": f"Internal server error processing response: {e}"}
 
-        return AskResponse(answer=extracted_text)
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Gemini API: {e}")
-        raise HTTPException(status_code=503, detail=f"Failed to communicate with Gemini API: {e}")
-    except Exception as e:
-        print(f"Unexpected error processing Gemini response: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error processing response: {e}")
+    async def results():
+        tasks = [asyncio.create_task(answer_one(key, question)) for key, question in distinct.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: stop queuing new Gemini calls
+            for task in tasks:
+                task.cancel()
+
+    check_gemini_key()
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def sse_event(data: dict, event: str = None) -> str:
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.post("/api/ask/stream", tags=["Gemini"])
+async def ask_gemini_stream(request: AskRequest):
+    """ Streams the answer as Server-Sent Events and saves it once complete. """
+    print(f"Received streaming question: {request.question}")
+    session = await load_session(request.session_id) if request.session_id else None
+    follow_up_prompt = build_session_prompt(session, request.question) if session else None
+    cached_answer = await lookup_cached_answer(request) if follow_up_prompt is None else None
+    if cached_answer is None:
+        check_gemini_key()
+    template, prompt = None, follow_up_prompt
+    if prompt is None and cached_answer is None:
+        template, prompt = build_prompt(request.question, await retrieve_passages(request.question))
+
+    async def event_stream():
+        if cached_answer is not None:
+            if session is not None:
+                await record_turn(session["id"], request.question, cached_answer)
+            yield sse_event({"text": cached_answer})
+            yield sse_event({"answer": cached_answer, "cached": True}, event="done")
+            return
+        chunks = []
+        gemini_in_flight.inc()
+        try:
+            with ask_stage_seconds.time(stage="upstream_stream"):
+                async for text in gemini.stream(prompt):
+                    chunks.append(text)
+                    yield sse_event({"text": text})
+        except httpx.HTTPError as e:
+            print(f"Error streaming from Gemini API: {e}")
+            yield sse_event({"detail": f"Failed to communicate with Gemini API: {e}"}, event="error")
+            return
+        except Exception as e:
+            print(f"Unexpected error processing Gemini stream: {e}")
+            yield sse_event({"detail": f"Internal server error processing response: {e}"}, event="error")
+            return
+        finally:
+            gemini_in_flight.dec()
+        answer = "".join(chunks).strip()
+        if not answer:
+            answer = "Gemini returned an empty answer."  # Shown, but not saved or cached
+        elif follow_up_prompt is None:
+            await persist_answer(request.question, answer, template)
+        if session is not None:
+            await record_turn(session["id"], request.question, answer)
+        yield sse_event({"answer": answer}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Conversations ---
+# A session's first question is answered like any other (shared cache, history). Follow-ups
+# are sent with the session summary plus as many recent turns as fit CONVERSATION_TOKEN_BUDGET;
+# when the verbatim turns outgrow it, the oldest are folded into the summary in the background.
+session_compactions = registry.counter("session_compactions_total", "Session summaries rewritten, by result.", ["result"])
+compactions = SingleFlight()
+compaction_tasks = set()  # Strong references until each background compaction finishes
+
+async def load_session(session_id: str) -> dict:
+    session = await db.run(conversations.load, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
+    return session
+
+def build_session_prompt(session: dict, question: str) -> Optional[str]:
+    """ Follow-up prompt with the conversation so far, or None for a session's first question. """
+    if not session["summary"] and not session["turns"]:
+        return None
+    with ask_stage_seconds.time(stage="prompt_build"):
+        used = session["summary_tokens"] + count_tokens(question)
+        turns = recent_turns(used, session["turns"], CONVERSATION_TOKEN_BUDGET)
+        return SESSION_TEMPLATE.format(context=format_turns(session["summary"], turns), question=question)
+
+async def record_turn(session_id: str, question: str, answer: str):
+    await db.run(conversations.add_turn, session_id, question, answer)
+    session = await db.run(conversations.load, session_id)
+    if session and turns_to_compact(session["summary_tokens"], session["turns"], CONVERSATION_TOKEN_BUDGET):
+        task = asyncio.create_task(compactions.do(session_id, lambda: compact_session(session_id)))
+        compaction_tasks.add(task)
+        task.add_done_callback(finish_compaction)
+
+def finish_compaction(task: asyncio.Task):
+    compaction_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        session_compactions.inc(result="error")
+        print(f"Error compacting session: {task.exception()}")
+
+async def compact_session(session_id: str):
+    """ Folds a session's oldest verbatim turns into its summary, at batch priority. """
+    session = await db.run(conversations.load, session_id)
+    if session is None:
+        return
+    folded = turns_to_compact(session["summary_tokens"], session["turns"], CONVERSATION_TOKEN_BUDGET)
+    if not folded:
+        return
+    prompt = SUMMARY_TEMPLATE.format(words=CONVERSATION_SUMMARY_WORDS, context=format_turns(session["summary"], folded))
+    summary = extract_text(await gemini.generate(prompt, BATCH)).strip()
+    if not summary:
+        session_compactions.inc(result="empty")
+        return  # Keep sending the turns verbatim (within budget) and try again after the next turn
+    await db.run(conversations.save_summary, session_id, summary, folded[-1]["id"])
+    session_compactions.inc(result="ok")
+    print(f"Folded {len(folded)} turns of session {session_id} into its summary.")
+
+@app.post("/api/sessions", response_model=SessionCreated, status_code=status.HTTP_201_CREATED, tags=["Sessions"])
+async def create_session():
+    """ Starts a conversation; pass the returned session_id with /api/ask or /api/ask/stream. """
+    return SessionCreated(session_id=await db.run(conversations.create))
+
+@app.get("/api/sessions/{session_id}", response_model=SessionDetail, tags=["Sessions"])
+async def get_session(session_id: str):
+    session = await db.run(conversations.load, session_id, True)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
+    return SessionDetail(
+        session_id=session["id"],
+        created=session["created"],
+        updated=session["updated"],
+        summary=session["summary"],
+        turns=[SessionTurn(**{k: turn[k] for k in ("id", "timestamp", "question", "answer")}) for turn in session["turns"]],
+    )
+
+@app.delete("/api/sessions/{session_id}", response_model=MessageResponse, tags=["Sessions"])
+async def delete_session(session_id: str):
+    if not await db.run(conversations.delete, session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
+    return {"message": f"Session '{session_id}' deleted."}
+
+@app.get("/api/cache/stats", tags=["Gemini"])
+async def get_cache_stats():
+    return {**answer_cache.stats(), "semantic": semantic_cache.stats(), "inflight": inflight.stats()}
+
+@app.get("/api/gemini/stats", tags=["Gemini"])
+async def get_gemini_stats():
+    return gemini_limiter.stats()
+
+@app.get("/api/persistence/stats", tags=["History"])
+async def get_persistence_stats():
+    return persistence.stats()
 
 @app.get("/api/history", response_model=list[HistoryItem], tags=["History"])
-async def get_history():
-    history_data = fetch_history()
-    return history_data
+async def get_history(
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    before: Optional[str] = None,
+):
+    """
+    Lists history newest first. Pass 'limit' to page through it; the cursor for
+    the next page comes back in the X-Next-Cursor header and goes in 'before'.
+    """
+    history_data, next_cursor = await db.run(fetch_history, limit, decode_history_cursor(before) if before else None)
+    # Rows come straight from SQLite in the documented shape; skip re-validating them
+    return FastJSONResponse(history_data, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+@app.get("/api/history/search", response_model=HistorySearchResponse, tags=["History"])
+async def search_history_items(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """ Full-text search over past questions and answers, best matches first. """
+    query = fts_query(q)
+    if not query:
+        return HistorySearchResponse(query=q, results=[])
+    try:
+        results = await db.run(search_history, query, limit + 1, offset)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    next_offset = offset + limit if len(results) > limit else None
+    return FastJSONResponse({"query": q, "results": results[:limit], "next_offset": next_offset})
 
 # --- Text File CRUD Endpoints ---
+# Files live in the content-addressed store; file_index mirrors its name index in memory.
+async def sync_file_index():
+    """
+    Applies the file changes other processes committed since this one last
+    looked (file_changes log), so every worker lists and serves the same files.
+    With a single worker it is one version query that finds nothing new.
+    """
+    version, full, rows = await db.run(file_store.changes_since, file_index.version)
+    if full:
+        file_index.build(rows)
+    else:
+        for name, size, mtime, digest in rows:
+            if digest is None:
+                file_index.remove(name)
+            else:
+                file_index.set(name, size, mtime, digest)
+    file_index.version = version
+
+async def store_file(filename: str, content: str):
+    size, mtime, digest = await db.run(file_store.put, filename, content)
+    file_index.set(filename, size, mtime, digest)
+    await schedule_reindex(filename)
+
+async def import_dropped_file(filename: str):
+    """ Watcher callback: pulls plain files copied into files/ into the store. """
+    if (stored := await db.run(file_store.import_plain, filename)) is not None:
+        file_index.set(filename, *stored)
+        await schedule_reindex(filename)
+        print(f"Imported {filename} into the file store.")
+
 @app.post("/api/files", response_model=MessageResponse, tags=["Files"])
 async def create_file(file_data: FileCreateRequest):
     """ Creates a new text file. """
     filename = file_data.filename  # Get filename from request
-    filepath = os.path.join(FILES_DIR, filename[:50])
     try:
-        with open(filepath, "w") as f:
-            f.write(file_data.content)
+        await store_file(filename[:50], file_data.content)
         return {"message": f"File '{filename}' created successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating file: {e}")
 
+def file_validators(filename: str):
+    """ Returns (etag, last_modified, mtime, digest, size) for a stored file. """
+    entry = file_index.get(filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
+    size, mtime, digest = entry
+    # The content hash makes a strong validator
+    return f'"{digest[:32]}"', formatdate(mtime, usegmt=True), mtime, digest, size
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if (if_none_match := request.headers.get("if-none-match")) is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110) and compares weakly:
+        # compressed responses send our strong ETags back as W/"..."
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if (if_modified_since := request.headers.get("if-modified-since")) is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(range_header: str, length: int):
+    """ Returns (start, end) inclusive for a single 'bytes=' range, None to ignore it, or raises 416. """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # Multiple ranges: serve the whole file instead
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else length - 1
+        else:
+            start, end = max(length - int(last), 0), length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable.", headers={"Content-Range": f"bytes */{length}"})
+    return start, min(end, length - 1)
+
+@app.get("/api/files/stats", tags=["Files"])
+async def get_file_store_stats():
+    stats = await db.run(file_store.stats)
+    return {**stats, "retrieval": {**await asyncio.to_thread(file_retrieval.stats), "queued": reindex_queue.depth}}
+
 @app.get("/api/files/{filename}", response_model=FileResponse, tags=["Files"])
-async def read_file(filename: str):
-    """ Reads the content of a text file. """
-    filepath = os.path.join(FILES_DIR, filename)
+async def read_file(filename: str, request: Request):
+    """ Reads the content of a text file. Answers 304 when the client's copy is current. """
+    await sync_file_index()
+    etag, last_modified, mtime, digest, _ = file_validators(filename)
+    validators = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+    if is_not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=validators)
     try:
-        with open(filepath, "r") as f:
-            content = f.read()
-        return {"filename": filename, "content": content}
+        content = await asyncio.to_thread(file_store.read, digest)
+        return FastJSONResponse({"filename": filename, "content": content}, headers=validators)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {e}")
 
+@app.get("/api/files/{filename}/raw", tags=["Files"])
+async def read_file_raw(filename: str, request: Request):
+    """ Returns the file as text/plain, with Range and conditional request support. """
+    await sync_file_index()
+    etag, last_modified, mtime, digest, size = file_validators(filename)
+    range_header = request.headers.get("range")
+    send_gzip = range_header is None and negotiate(request.headers.get("accept-encoding", ""), ["gzip"]) == "gzip"
+    if send_gzip:
+        etag = etag[:-1] + '-gz"'  # Each encoding of the content gets its own strong validator
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if is_not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+    if send_gzip:
+        # The blob is already gzip: send it as-is without decompressing
+        return RawFileResponse(
+            file_store.blob_path(digest),
+            media_type="text/plain; charset=utf-8",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+    byte_range = parse_range(range_header, size) if range_header else None
+    start, end = byte_range or (0, size - 1)
+    try:
+        # Decompressed a chunk at a time off the event loop, starting at the range
+        chunks = await asyncio.to_thread(file_store.open_range, digest, start, end - start + 1)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range is None:
+        return StreamingResponse(chunks, media_type="text/plain; charset=utf-8", headers={**headers, "Accept-Ranges": "bytes"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(chunks, status_code=206, media_type="text/plain; charset=utf-8", headers=headers)
+
 @app.put("/api/files/{filename}", response_model=MessageResponse, tags=["Files"])
 async def update_file(filename: str, file_data: FileUpdateRequest):
     """ Updates the content of an existing text file. """
-    filepath = os.path.join(FILES_DIR, filename)
     try:
-        with open(filepath, "w") as f:
-            f.write(file_data.content)
+        await store_file(filename, file_data.content)
         return {"message": f"File '{filename}' updated successfully."}
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating file: {e}")
 
 @app.delete("/api/files/{filename}", response_model=MessageResponse, tags=["Files"])
 async def delete_file(filename: str):
     """ Deletes a text file. """
-    filepath = os.path.join(FILES_DIR, filename)
     try:
-        os.remove(filepath)
-        return {"message": f"File '{filename}' deleted successfully."}
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
+        deleted = await db.run(file_store.delete, filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting file: {e}")
-        
-def get_files_sorted_by_date():
-    files = []
-    for filename in os.listdir(FILES_DIR):
-        filepath = os.path.join(FILES_DIR, filename)
-        if os.path.isfile(filepath):
-            try:
-                # Get modification time and sort by it.  Error handling is crucial.
-                timestamp = os.path.getmtime(filepath)
-                files.append({"name": filename, "lastModified": timestamp})
-            except OSError as e:
-                print(f"Error accessing file {filepath}: {e}")
-    files.sort(key=lambda x: x['lastModified'], reverse=True)
-    return files
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found.")
+    file_index.remove(filename)
+    await schedule_reindex(filename)
+    return {"message": f"File '{filename}' deleted successfully."}
 
 @app.get("/api/files", response_model=list[FileInfo], tags=["Files"])
-async def list_files():
-    """ Lists all text files in the designated directory. """
-    try:
-        filenames = [f for f in os.listdir(FILES_DIR) if os.path.isfile(os.path.join(FILES_DIR, f))]
-        return [FileInfo(filename=name) for name in filenames]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error listing files: {e}")
+async def list_files(
+    sort: Literal["name", "mtime", "size"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    prefix: str = "",
+    limit: Optional[int] = Query(None, ge=1, le=FILES_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Lists text files from the in-memory index. The number of files matching
+    'prefix' is returned in the X-Total-Count header for paging.
+    """
+    await sync_file_index()
+    total, entries = file_index.list(sort, order == "desc", prefix, offset, limit)
+    return FastJSONResponse(
+        [{"filename": name, "size": size, "modified": mtime} for name, size, mtime in entries],
+        headers={"X-Total-Count": str(total)},
+    )
+
+
+# --- Bulk Export / Import ---
+# NDJSON, one record per line: {"type": "history", ...} or {"type": "file", ...}.
+# Both directions work in fixed-size batches so memory stays flat however large the instance is.
+def read_files(entries: list) -> list:
+    return [(name, mtime, file_store.read(digest)) for name, _, mtime, digest in entries]
+
+@app.get("/api/export", tags=["Backup"])
+async def export_archive(include: str = "history,files"):
+    """ Streams the history table and/or the files store as NDJSON. """
+    parts = {part.strip() for part in include.split(",")}
+
+    async def records():
+        if "history" in parts:
+            after_id = 0
+            while rows := await db.run(fetch_history_batch, after_id, EXPORT_BATCH_SIZE):
+                yield "".join(
+                    json.dumps({
+                        "type": "history", "id": row[0], "timestamp": row[1], "question": row[2], "answer": row[3],
+                        "ask_count": row[4], "last_asked": row[5],
+                    }) + "\n"
+                    for row in rows
+                )
+                after_id = rows[-1][0]
+        if "files" in parts:
+            await sync_file_index()
+            entries = file_index.items()
+            for start in range(0, len(entries), EXPORT_BATCH_SIZE):
+                try:
+                    files = await asyncio.to_thread(read_files, entries[start:start + EXPORT_BATCH_SIZE])
+                except FileNotFoundError:
+                    # A file was replaced mid-export; read this batch one by one and skip what's gone
+                    files = []
+                    for entry in entries[start:start + EXPORT_BATCH_SIZE]:
+                        try:
+                            files += await asyncio.to_thread(read_files, [entry])
+                        except FileNotFoundError:
+                            continue
+                yield "".join(
+                    json.dumps({"type": "file", "name": name, "mtime": mtime, "content": content}) + "\n"
+                    for name, mtime, content in files
+                )
 
+    return StreamingResponse(
+        records(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="learning-assistant-export.ndjson"'},
+    )
+
+def is_valid_import_record(record) -> bool:
+    """ Checks an /api/import record's field types before it is queued, so a bad one is skipped, not a failed batch. """
+    if not isinstance(record, dict):
+        return False
+    optional_text = lambda value: value is None or isinstance(value, str)
+    if record.get("type") == "history":
+        ask_count = record.get("ask_count", 1)
+        return (
+            isinstance(record.get("question"), str) and isinstance(record.get("answer"), str)
+            and type(ask_count) is int and ask_count >= 1
+            and optional_text(record.get("timestamp")) and optional_text(record.get("last_asked"))
+        )
+    if record.get("type") == "file":
+        mtime = record.get("mtime")
+        return (
+            isinstance(record.get("name"), str) and record["name"] != "" and isinstance(record.get("content"), str)
+            and (mtime is None or (isinstance(mtime, (int, float)) and not isinstance(mtime, bool)))
+        )
+    return False
+
+@app.post("/api/import", tags=["Backup"])
+async def import_archive(request: Request):
+    """
+    Ingests an NDJSON export from the request body as it streams in. History
+    rows are merged by question/answer pair (see import_history_rows); files
+    overwrite any file with the same name.
+    """
+    counts = {"history": 0, "files": 0, "skipped": 0}
+    history_rows, file_rows = [], []
+
+    async def flush_history():
+        await db.run(import_history_rows, history_rows)
+        counts["history"] += len(history_rows)
+        history_rows.clear()
+
+    async def flush_files():
+        for name, size, mtime, digest in await db.run(file_store.put_many, file_rows):
+            file_index.set(name, size, mtime, digest)
+        await schedule_reindex(*(name for name, _, _ in file_rows))
+        counts["files"] += len(file_rows)
+        file_rows.clear()
+
+    async def handle(line: bytes):
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not is_valid_import_record(record):
+            counts["skipped"] += 1
+        elif record["type"] == "history":
+            history_rows.append((
+                record.get("timestamp"), record["question"], record["answer"],
+                record.get("ask_count", 1), record.get("last_asked"),
+            ))
+        else:
+            file_rows.append((record["name"], record["content"], record.get("mtime")))
+        if len(history_rows) >= IMPORT_BATCH_SIZE:
+            await flush_history()
+        if len(file_rows) >= IMPORT_BATCH_SIZE:
+            await flush_files()
+
+    try:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                await handle(line)
+        await handle(buffer)
+        if history_rows:
+            await flush_history()
+        if file_rows:
+            await flush_files()
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error after importing {counts}: {e}")
+    return counts
 
 # --- API Endpoints ---
 
@@ -285,43 +1643,34 @@ async def list_files():
 
 @app.get("/api/history/{item_id}", response_model=HistoryItem, tags=["History"])
 async def get_history_item(item_id: int):
-    conn = create_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, timestamp, question, answer FROM history WHERE id = ?", (item_id,))
-        row = cursor.fetchone()
-        if row:
-            return HistoryItem(id=row[0], timestamp=row[1], question=row[2], answer=row[3])
-        else:
-            raise HTTPException(status_code=404, detail=f"History item with ID {item_id} not found")
+        item = await db.run(fetch_history_item, item_id)
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"History item with ID {item_id} not found")
+    return item
 
 @app.put("/api/history/{item_id}", response_model=HistoryItem, tags=["History"])
 async def update_history_item(item_id: int, item_update: HistoryItemUpdate):
-    conn = create_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE history SET question=?, answer=? WHERE id=?",
-            (item_update.question, item_update.answer, item_id),
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            # Fetch the updated item to return
-            cursor.execute("SELECT id, timestamp, question, answer FROM history WHERE id = ?", (item_id,))
-            row = cursor.fetchone()
-            return HistoryItem(id=row[0], timestamp=row[1], question=row[2], answer=row[3])
-        else:
-            raise HTTPException(status_code=404, detail=f"History item with ID {item_id} not found")
+        old_key, item = await db.run(update_history_row, item_id, item_update.question, item_update.answer)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail="Another history item already has this question and answer.")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"History item with ID {item_id} not found")
+    # Edited answers must not be served from a stale memory entry
+    new_key = cache_key(item.question, PROMPT_TEMPLATE)
+    answer_cache.invalidate(new_key, old_key)
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            await asyncio.to_thread(semantic_cache.remove, [old_key])
+            await asyncio.to_thread(semantic_cache.add, [(new_key, item.question, item.answer)], PROMPT_TEMPLATE)
+        except Exception as e:
+            print(f"Error updating semantic cache: {e}")
+    return item
 '''
 @app.get("/video_id")
 async def get_video_id():
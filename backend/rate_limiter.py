@@ -0,0 +1,130 @@
+# backend/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+INTERACTIVE = 0  # Lower value = served first
+BATCH = 1
+
+
+class TokenBucket:
+    """ Refills continuously at rate_per_minute up to capacity; may go negative after a correction. """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """ Seconds until 'amount' tokens are available (0 if they are now). """
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket, not forever
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Request and token budgets for one upstream, shared by priority lanes.
+
+    Callers queue in priority order and only the head of the queue may draw
+    from the buckets, so interactive requests overtake queued batch work. A
+    429 pauses everyone for the server's Retry-After and halves the request
+    rate; each success afterwards recovers a little of it.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.max_rpm = requests_per_minute
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._waiters = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Condition()
+        self._paused_until = 0.0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(
+            self._paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+        )
+
+    async def acquire(self, tokens: float, priority: int = INTERACTIVE):
+        entry = (priority, next(self._seq))
+        started = time.monotonic()
+        async with self._changed:
+            heapq.heappush(self._waiters, entry)
+            self._changed.notify_all()  # A new head may need to take over the wait
+            try:
+                while True:
+                    wait = self._wait_time(tokens) if self._waiters[0] == entry else None
+                    if wait is not None and wait <= 0:
+                        heapq.heappop(self._waiters)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self._changed.notify_all()
+                        self.waited_seconds += time.monotonic() - started
+                        return
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._changed.notify_all()
+                raise
+
+    def record_usage(self, estimated: float, actual: float):
+        """ Corrects the token bucket once the real token count is known. """
+        self.tokens.take(actual - estimated)
+
+    def record_success(self):
+        # Additive recovery towards the configured rate after a throttle
+        if self.requests.rate * 60 < self.max_rpm:
+            self.requests.rate = min(self.max_rpm, self.requests.rate * 60 + 1) / 60.0
+
+    def throttle(self, delay: float):
+        """ Upstream said 429: pause every lane and halve the request rate. """
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.requests.rate = max(self.requests.rate / 2, 1 / 60.0)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._waiters),
+            "current_rpm": round(self.requests.rate * 60, 2),
+            "max_rpm": self.max_rpm,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+def retry_delay(attempt: int, base: float, cap: float, retry_after: str = None) -> float:
+    """ Server's Retry-After when given, otherwise full-jitter exponential backoff. """
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(cap, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,135 @@
+# backend/retrieval.py
+import re
+
+
+def chunk_text(text: str, chunk_chars: int = 1200, overlap: int = 200) -> list:
+    """
+    Splits text into chunks of about chunk_chars, on paragraph boundaries where
+    possible. A short final paragraph is repeated at the start of the next
+    chunk, and oversized paragraphs are cut with 'overlap' characters shared.
+    """
+    check_chunking(chunk_chars, overlap)
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_chars:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            chunks.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars - overlap:]
+        if current and size + len(paragraph) > chunk_chars:
+            chunks.append("\n\n".join(current))
+            # Carry the last paragraph over when it is short enough to serve as overlap
+            current = current[-1:] if len(current[-1]) <= overlap else []
+            size = sum(len(p) for p in current)
+        current.append(paragraph)
+        size += len(paragraph)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def check_chunking(chunk_chars: int, overlap: int):
+    """ Raises ValueError unless 0 <= overlap < chunk_chars; otherwise cutting a long paragraph never advances. """
+    if not 0 <= overlap < chunk_chars:
+        raise ValueError(f"Chunk overlap must be at least 0 and less than the chunk size ({chunk_chars}), got {overlap}")
+
+
+class FileRetrieval:
+    """
+    Chunked vector index over the stored files, for retrieval-augmented prompts.
+
+    Each file's chunks are stored under ids "<name>#<n>" with the file's
+    content digest, so sync() only re-embeds files whose digest changed and
+    a restart only catches up on what changed while the server was down.
+    Uses the shared VectorStore; blocking, so run it off the event loop.
+    """
+
+    def __init__(self, store, collection_name: str = "file_chunks", chunk_chars: int = 1200,
+                 overlap: int = 200, min_similarity: float = 0.3):
+        check_chunking(chunk_chars, overlap)  # Bad settings fail at startup, not inside a sync
+        self.store = store
+        self.collection_name = collection_name
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.min_similarity = min_similarity
+        self.embedded_files = 0
+        self.embedded_chunks = 0
+
+    def _collection(self):
+        if not self.store.load():
+            return None
+        return self.store.collection(self.collection_name)
+
+    def indexed_digests(self, names: list = None) -> dict:
+        """ {file name: digest} for every indexed file, or just for 'names'. """
+        collection = self._collection()
+        if collection is None:
+            return {}
+        where = {"chunk": 0} if names is None else {"$and": [{"chunk": 0}, {"file": {"$in": names}}]}
+        result = collection.get(where=where, include=["metadatas"])
+        return {meta["file"]: meta["digest"] for meta in result["metadatas"]}
+
+    def sync(self, files: list):
+        """
+        Brings the index in line with (name, digest, text) entries; a None
+        digest removes the file. Files already indexed at that digest are skipped.
+        """
+        collection = self._collection()
+        if collection is None or not files:
+            return
+        indexed = self.indexed_digests([name for name, _, _ in files])
+        stale = [name for name, digest, _ in files if name in indexed and indexed[name] != digest]
+        stale += [name for name, digest, _ in files if digest is None and name in indexed]
+        if stale:
+            collection.delete(where={"file": {"$in": list(set(stale))}})
+        ids, documents, metadatas = [], [], []
+        for name, digest, text in files:
+            if digest is None or indexed.get(name) == digest:
+                continue
+            self.embedded_files += 1
+            for n, chunk in enumerate(chunk_text(text, self.chunk_chars, self.overlap)):
+                ids.append(f"{name}#{n}")
+                documents.append(chunk)
+                metadatas.append({"file": name, "digest": digest, "chunk": n})
+        for start in range(0, len(ids), 256):
+            collection.upsert(
+                ids=ids[start:start + 256],
+                documents=documents[start:start + 256],
+                embeddings=self.store.embed(documents[start:start + 256]),
+                metadatas=metadatas[start:start + 256],
+            )
+        self.embedded_chunks += len(ids)
+
+    def search(self, query: str, k: int = 3) -> list:
+        """ Up to k (file name, passage, similarity) tuples, best first, above min_similarity. """
+        if not self.store.loaded:
+            return []  # Never wait for the model on the request path
+        collection = self._collection()
+        if collection.count() == 0:
+            return []
+        result = collection.query(
+            query_embeddings=self.store.embed([query]),
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        passages = []
+        for document, meta, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0]):
+            if 1.0 - distance >= self.min_similarity:
+                passages.append((meta["file"], document, 1.0 - distance))
+        return passages
+
+    def stats(self) -> dict:
+        collection = self._collection() if self.store.loaded else None
+        return {
+            "available": self.store.available,
+            "loaded": self.store.loaded,
+            "chunks": collection.count() if collection is not None else 0,
+            "embedded_files": self.embedded_files,
+            "embedded_chunks": self.embedded_chunks,
+        }
@@ -0,0 +1,101 @@
+# backend/semantic_cache.py
+import hashlib
+
+
+class SemanticCache:
+    """
+    Nearest-question answer cache backed by a persistent ChromaDB collection.
+
+    Questions are embedded with the shared VectorStore model; a lookup
+    returns the stored answer of the closest prior question when its cosine
+    similarity reaches the threshold. Lookups never load the model: until the
+    warm-up has loaded it (or if that failed) they count as misses.
+    """
+
+    def __init__(self, store, collection_name: str = "question_cache", threshold: float = 0.85):
+        self.store = store
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._collection = None
+
+    @property
+    def available(self) -> bool:
+        return self.store.available
+
+    @property
+    def loaded(self) -> bool:
+        return self._collection is not None
+
+    def _ensure_loaded(self) -> bool:
+        if self._collection is None:
+            if not self.store.load():
+                return False
+            self._collection = self.store.collection(self.collection_name)
+        return True
+
+    def _embed(self, texts: list) -> list:
+        return self.store.embed(texts)
+
+    @staticmethod
+    def _template_id(template: str) -> str:
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, question: str, templates: list):
+        """
+        Returns (answer, similarity, matched_question, template) for the closest
+        question answered with any of 'templates', or None. Blocking; run off
+        the event loop.
+        """
+        if not self.store.loaded:
+            self.misses += 1  # Not loaded yet (or failed); answer from Gemini rather than load on the request path
+            return None
+        if not self._ensure_loaded() or self._collection.count() == 0:
+            self.misses += 1
+            return None
+        by_id = {self._template_id(template): template for template in templates}
+        result = self._collection.query(
+            query_embeddings=self._embed([question]),
+            n_results=1,
+            where={"template": {"$in": list(by_id)}},
+            include=["documents", "metadatas", "distances"],
+        )
+        if result["ids"] and result["ids"][0]:
+            similarity = 1.0 - result["distances"][0][0]
+            if similarity >= self.threshold:
+                self.hits += 1
+                metadata = result["metadatas"][0][0]
+                return metadata["answer"], similarity, result["documents"][0][0], by_id[metadata["template"]]
+        self.misses += 1
+        return None
+
+    def add(self, items: list, template: str):
+        """ Indexes (key, question, answer) tuples. Blocking; run off the event loop. """
+        if not items or not self._ensure_loaded():
+            return
+        template_id = self._template_id(template)
+        self._collection.upsert(
+            ids=[key for key, _, _ in items],
+            documents=[question for _, question, _ in items],
+            embeddings=self._embed([question for _, question, _ in items]),
+            metadatas=[{"answer": answer, "template": template_id} for _, _, answer in items],
+        )
+
+    def remove(self, keys: list):
+        if keys and self._ensure_loaded():
+            self._collection.delete(ids=keys)
+
+    def is_empty(self) -> bool:
+        return not self._ensure_loaded() or self._collection.count() == 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.available,
+            "loaded": self.loaded,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
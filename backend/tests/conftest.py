@@ -0,0 +1,33 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_main(tmp_path_factory):
+    """ backend/main.py imported against a scratch database and files/ directory, vector features off. """
+    root = tmp_path_factory.mktemp("app")
+    os.environ.update(
+        DATABASE_FILE=str(root / "learning_history.db"),
+        FILES_DIR=str(root / "files"),
+        SEMANTIC_CACHE_DIR=str(root / "chroma_db"),
+        SEMANTIC_CACHE_ENABLED="0",
+        RETRIEVAL_ENABLED="0",
+    )
+    import main
+    main.create_history_table()
+    return main
+
+
+@pytest.fixture
+def history(app_main):
+    """ The app module with an empty history table. """
+    conn = app_main.db.connect()
+    conn.execute("DELETE FROM history")
+    conn.commit()
+    return app_main
@@ -0,0 +1,93 @@
+# backend/tests/test_blob_store.py
+import os
+
+import pytest
+
+import blob_store
+from blob_store import BlobStore
+from database import Database
+
+
+@pytest.fixture
+def store(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    store = BlobStore(str(tmp_path / "files"), db)
+    store.create_tables()
+    yield store
+    db.close()
+
+
+def blob_exists(store: BlobStore, digest: str) -> bool:
+    return os.path.exists(store.blob_path(digest))
+
+
+def test_same_content_is_stored_once(store):
+    _, _, first = store.put("a.txt", "shared")
+    _, _, second = store.put("b.txt", "shared")
+    assert first == second
+    assert store.stats()["names"] == 2
+    assert store.stats()["blobs"] == 1
+    assert store.read(first) == "shared"
+
+
+def test_blob_is_kept_until_its_last_name_goes(store):
+    _, _, digest = store.put("a.txt", "shared")
+    store.put("b.txt", "shared")
+    assert store.delete("a.txt")
+    assert blob_exists(store, digest)
+    assert store.delete("b.txt")
+    assert not blob_exists(store, digest)
+    assert not store.delete("b.txt")
+
+
+def test_replacing_content_releases_the_old_blob(store):
+    _, _, old = store.put("a.txt", "old")
+    _, _, new = store.put("a.txt", "new")
+    assert not blob_exists(store, old)
+    assert store.read(new) == "new"
+
+
+def test_replacing_content_keeps_a_blob_another_name_uses(store):
+    _, _, old = store.put("a.txt", "old")
+    store.put("b.txt", "old")
+    store.put("a.txt", "new")
+    assert blob_exists(store, old)
+
+
+def test_changes_since_lists_changed_and_deleted_names(store):
+    version, full, _ = store.changes_since(None)
+    assert full
+    store.put("a.txt", "one")
+    store.put("b.txt", "two")
+    store.delete("a.txt")
+    _, full, rows = store.changes_since(version)
+    assert not full
+    assert sorted(rows) == sorted([("a.txt", None, None, None), ("b.txt", *store.entries()[0][1:])])
+
+
+def test_pruned_change_log_forces_a_full_rebuild(store, monkeypatch):
+    monkeypatch.setattr(blob_store, "CHANGES_KEPT", 2)
+    store.put("a.txt", "1")
+    version, _, _ = store.changes_since(None)
+    for i in range(5):
+        store.put(f"n{i}.txt", str(i))
+    _, full, rows = store.changes_since(version)
+    assert full
+    assert len(rows) == 6
+
+
+def test_open_range_streams_part_of_a_blob(store):
+    _, _, digest = store.put("a.txt", "0123456789" * 10000)
+    assert b"".join(store.open_range(digest, 5, 10)) == b"5678901234"
+    assert len(b"".join(store.open_range(digest))) == 100000
+    with pytest.raises(FileNotFoundError):
+        store.open_range("0" * 64)
+
+
+def test_plain_files_are_indexed_in_place(store):
+    path = os.path.join(store.root, "notes.txt")
+    with open(path, "w") as f:
+        f.write("plain")
+    assert store.import_plain_files() == 1
+    assert os.path.exists(path)
+    assert store.import_plain_files() == 0  # Unchanged since the last import
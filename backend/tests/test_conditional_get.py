@@ -0,0 +1,37 @@
+# backend/tests/test_conditional_get.py
+from email.utils import formatdate
+
+import pytest
+from starlette.requests import Request
+
+ETAG = '"0123456789abcdef"'
+MTIME = 1_700_000_000.5
+
+
+def request_with(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+@pytest.mark.parametrize("if_none_match", [ETAG, f"W/{ETAG}", f'"other", {ETAG}', "*"])
+def test_matching_etag_is_not_modified(app_main, if_none_match):
+    assert app_main.is_not_modified(request_with(if_none_match=if_none_match), ETAG, MTIME)
+
+
+def test_different_etag_is_modified(app_main):
+    assert not app_main.is_not_modified(request_with(if_none_match='"other"'), ETAG, MTIME)
+
+
+def test_if_none_match_wins_over_if_modified_since(app_main):
+    request = request_with(if_none_match='"other"', if_modified_since=formatdate(MTIME + 60, usegmt=True))
+    assert not app_main.is_not_modified(request, ETAG, MTIME)
+
+
+def test_if_modified_since_compares_whole_seconds(app_main):
+    assert app_main.is_not_modified(request_with(if_modified_since=formatdate(MTIME, usegmt=True)), ETAG, MTIME)
+    assert not app_main.is_not_modified(request_with(if_modified_since=formatdate(MTIME - 60, usegmt=True)), ETAG, MTIME)
+
+
+def test_unparseable_date_or_no_validators_is_modified(app_main):
+    assert not app_main.is_not_modified(request_with(if_modified_since="yesterday"), ETAG, MTIME)
+    assert not app_main.is_not_modified(request_with(), ETAG, MTIME)
@@ -0,0 +1,35 @@
+# backend/tests/test_content_encoding.py
+from content_encoding import negotiate
+
+PREFERENCE = ["zstd", "br", "gzip"]
+
+
+def test_equal_quality_goes_by_our_preference():
+    assert negotiate("gzip, br", PREFERENCE) == "br"
+
+
+def test_higher_quality_wins_over_preference():
+    assert negotiate("br;q=0.5, gzip;q=0.9", PREFERENCE) == "gzip"
+
+
+def test_zero_quality_refuses_a_coding():
+    assert negotiate("gzip;q=0", ["gzip"]) is None
+    assert negotiate("br;q=0, gzip", PREFERENCE) == "gzip"
+
+
+def test_wildcard_covers_unnamed_codings():
+    assert negotiate("*", PREFERENCE) == "zstd"
+    assert negotiate("zstd;q=0, *;q=0.5", PREFERENCE) == "br"
+
+
+def test_nothing_acceptable():
+    assert negotiate("", PREFERENCE) is None
+    assert negotiate("identity", PREFERENCE) is None
+
+
+def test_parameters_are_case_and_space_insensitive():
+    assert negotiate(" GZIP ; Q=0.8 ", ["gzip"]) == "gzip"
+
+
+def test_malformed_quality_counts_as_refused():
+    assert negotiate("gzip;q=abc", ["gzip"]) is None
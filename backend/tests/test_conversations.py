@@ -0,0 +1,26 @@
+# backend/tests/test_conversations.py
+from conversations import turns_to_compact
+
+
+def turns(*tokens: int) -> list:
+    return [{"id": i, "tokens": count} for i, count in enumerate(tokens)]
+
+
+def test_nothing_to_compact_within_budget():
+    assert turns_to_compact(100, turns(200, 300), budget=600) == []
+
+
+def test_oldest_turns_are_folded_down_to_half_the_budget():
+    folded = turns_to_compact(0, turns(300, 300, 300, 100), budget=800)
+    # 1000 tokens: fold the oldest until at most 400 remain verbatim
+    assert [turn["id"] for turn in folded] == [0, 1]
+
+
+def test_summary_counts_towards_the_budget():
+    assert turns_to_compact(500, turns(200, 200), budget=800) == turns(200, 200)[:1]
+
+
+def test_latest_turn_is_never_folded():
+    folded = turns_to_compact(0, turns(100, 5000), budget=1000)
+    assert [turn["id"] for turn in folded] == [0]
+    assert turns_to_compact(0, turns(5000), budget=1000) == []
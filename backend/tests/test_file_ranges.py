@@ -0,0 +1,27 @@
+# backend/tests/test_file_ranges.py
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-5", (95, 99)),
+    ("bytes=90-200", (90, 99)),  # Clamped to the end of the file
+    ("bytes=-500", (0, 99)),
+])
+def test_single_ranges(app_main, header, expected):
+    assert app_main.parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-6", "items=0-9", "bytes=a-b"])
+def test_ranges_served_as_the_whole_file(app_main, header):
+    assert app_main.parse_range(header, 100) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10"])
+def test_unsatisfiable_ranges(app_main, header):
+    with pytest.raises(HTTPException) as error:
+        app_main.parse_range(header, 100)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */100"
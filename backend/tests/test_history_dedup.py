@@ -0,0 +1,73 @@
+# backend/tests/test_history_dedup.py
+
+
+def rows(main):
+    conn = main.db.connect()
+    return conn.execute(
+        "SELECT question, answer, ask_count, timestamp, last_asked FROM history ORDER BY id"
+    ).fetchall()
+
+
+def add_unhashed(main, *items):
+    """ Rows as saved before deduplication: no content_hash. """
+    conn = main.db.connect()
+    conn.executemany(
+        "INSERT INTO history (timestamp, question, answer, cache_key) VALUES (?, ?, ?, 'legacy')",
+        items,
+    )
+    conn.commit()
+
+
+def test_import_twice_changes_nothing(history):
+    archive = [
+        ("2024-01-01 10:00:00", "q1", "a1", 3, "2024-01-05 10:00:00"),
+        ("2024-01-02 10:00:00", "q2", "a2", 1, None),
+    ]
+    history.import_history_rows(archive)
+    first = rows(history)
+    history.import_history_rows(archive)
+    assert rows(history) == first
+    assert [row[2] for row in first] == [3, 1]
+
+
+def test_import_keeps_the_larger_count_and_wider_dates(history):
+    history.import_history_rows([("2024-01-02 00:00:00", "q", "a", 5, "2024-01-03 00:00:00")])
+    history.import_history_rows([("2024-01-01 00:00:00", "q", "a", 2, "2024-01-04 00:00:00")])
+    assert rows(history) == [("q", "a", 5, "2024-01-01 00:00:00", "2024-01-04 00:00:00")]
+
+
+def test_compaction_folds_duplicates_into_the_oldest_row(history):
+    add_unhashed(
+        history,
+        ("2024-01-01 00:00:00", "q", "a"),
+        ("2024-01-02 00:00:00", "other", "b"),
+        ("2024-01-03 00:00:00", "q", "a"),
+    )
+    assert history.compact_history_batch(100) == (3, 1)
+    assert rows(history) == [
+        ("q", "a", 2, "2024-01-01 00:00:00", "2024-01-03 00:00:00"),
+        ("other", "b", 1, "2024-01-02 00:00:00", "2024-01-02 00:00:00"),
+    ]
+    assert history.compact_history_batch(100) == (0, 0)
+
+
+def test_compaction_runs_in_batches(history):
+    add_unhashed(history, *[(f"2024-01-0{day} 00:00:00", "q", "a") for day in range(1, 6)])
+    assert history.compact_history_batch(2) == (2, 1)
+    assert history.compact_history_batch(2) == (2, 2)
+    assert history.compact_history_batch(2) == (1, 1)
+    assert [row[2] for row in rows(history)] == [5]
+
+
+def test_compaction_folds_into_an_already_hashed_row(history):
+    history.import_history_rows([("2024-01-05 00:00:00", "q", "a", 2, None)])
+    add_unhashed(history, ("2024-01-01 00:00:00", "q", "a"))
+    assert history.compact_history_batch(100) == (1, 1)
+    assert rows(history) == [("q", "a", 3, "2024-01-01 00:00:00", "2024-01-05 00:00:00")]
+
+
+def test_cached_asks_are_counted_on_the_latest_row(history):
+    history.save_question_answers([("q", "a", history.PROMPT_TEMPLATE)])
+    key = history.cache_key("q", history.PROMPT_TEMPLATE)
+    history.count_cached_asks([key, key, "no such key"])
+    assert rows(history)[0][2] == 3
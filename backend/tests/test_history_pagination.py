@@ -0,0 +1,50 @@
+# backend/tests/test_history_pagination.py
+import pytest
+from fastapi import HTTPException
+
+
+def add_rows(main, count: int, timestamp: str = "2024-01-01 00:00:00"):
+    """ Rows sharing one timestamp, so only the id breaks ties between them. """
+    main.import_history_rows([(timestamp, f"question {i}", f"answer {i}", 1, None) for i in range(count)])
+
+
+def test_pages_cover_every_row_once_newest_first(history):
+    add_rows(history, 7)
+    history.import_history_rows([("2024-02-01 00:00:00", "newest", "answer", 1, None)])
+    seen, before = [], None
+    while True:
+        items, cursor = history.fetch_history(3, history.decode_history_cursor(before) if before else None)
+        seen.extend(item["question"] for item in items)
+        if cursor is None:
+            break
+        before = cursor
+    assert seen[0] == "newest"
+    assert sorted(seen[1:]) == sorted(f"question {i}" for i in range(7))
+    assert len(seen) == len(set(seen)) == 8
+
+
+def test_last_full_page_has_no_cursor(history):
+    add_rows(history, 3)
+    items, cursor = history.fetch_history(3)
+    assert len(items) == 3
+    assert cursor is None
+
+
+def test_rows_added_while_paging_are_not_repeated(history):
+    add_rows(history, 4)
+    first, cursor = history.fetch_history(2)
+    history.import_history_rows([("2024-03-01 00:00:00", "late", "answer", 1, None)])
+    second, _ = history.fetch_history(2, history.decode_history_cursor(cursor))
+    assert not {item["id"] for item in first} & {item["id"] for item in second}
+    assert "late" not in [item["question"] for item in second]
+
+
+def test_cursor_round_trip(app_main):
+    cursor = app_main.encode_history_cursor("2024-01-01 00:00:00", 42)
+    assert app_main.decode_history_cursor(cursor) == ("2024-01-01 00:00:00", 42)
+
+
+def test_bad_cursor_is_a_400(app_main):
+    with pytest.raises(HTTPException) as error:
+        app_main.decode_history_cursor("not-a-cursor")
+    assert error.value.status_code == 400
@@ -0,0 +1,25 @@
+# backend/tests/test_metrics.py
+from metrics import Registry
+
+
+def test_counter_reads_running_totals_from_its_callback():
+    registry = Registry()
+    totals = {"hit": 3, "miss": 1}
+    registry.counter("lookups_total", "Lookups by result.", ["result"], callback=lambda: totals)
+    lines = registry.render().splitlines()
+    assert "# TYPE lookups_total counter" in lines
+    assert 'lookups_total{result="hit"} 3' in lines
+    assert 'lookups_total{result="miss"} 1' in lines
+
+
+def test_gauge_and_histogram_render():
+    registry = Registry()
+    registry.gauge("queue_depth", "Items queued.", callback=lambda: 7)
+    latency = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    latency.observe(0.5, route="/a")
+    lines = registry.render().splitlines()
+    assert "queue_depth 7" in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 1' in lines
+    assert 'latency_seconds_count{route="/a"} 1' in lines
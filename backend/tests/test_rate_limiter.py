@@ -0,0 +1,72 @@
+# backend/tests/test_rate_limiter.py
+import asyncio
+
+from rate_limiter import BATCH, INTERACTIVE, RateLimiter
+
+
+def make_limiter(requests_per_minute: float = 60) -> RateLimiter:
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute=1_000_000)
+    limiter.requests.tokens = 0  # Empty bucket: callers queue until the refill
+    return limiter
+
+
+def test_interactive_overtakes_queued_batch():
+    async def scenario():
+        limiter = make_limiter(requests_per_minute=600)  # One request every 0.1s
+        order = []
+
+        async def caller(name, priority):
+            await limiter.acquire(1, priority)
+            order.append(name)
+
+        batch = [asyncio.create_task(caller(f"batch{i}", BATCH)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(caller("interactive", INTERACTIVE))
+        await asyncio.gather(*batch, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "batch0", "batch1"]
+
+
+def test_equal_priority_is_first_come_first_served():
+    async def scenario():
+        limiter = make_limiter(requests_per_minute=600)
+        order = []
+
+        async def caller(name):
+            await limiter.acquire(1, BATCH)
+            order.append(name)
+
+        tasks = []
+        for i in range(3):
+            tasks.append(asyncio.create_task(caller(i)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = make_limiter(requests_per_minute=600)
+        head = asyncio.create_task(limiter.acquire(1, INTERACTIVE))
+        behind = asyncio.create_task(limiter.acquire(1, BATCH))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queued"] == 2
+        head.cancel()
+        await asyncio.gather(head, return_exceptions=True)
+        # The caller behind the cancelled head is served instead of waiting forever
+        await asyncio.wait_for(behind, 1)
+        return limiter.stats()["queued"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_throttle_halves_rate_and_success_recovers_it():
+    limiter = RateLimiter(60, tokens_per_minute=1000)
+    limiter.throttle(0)
+    assert limiter.stats()["current_rpm"] == 30
+    limiter.record_success()
+    assert limiter.stats()["current_rpm"] == 31
+    assert limiter.throttled == 1
@@ -0,0 +1,22 @@
+# backend/tests/test_retrieval.py
+import pytest
+
+from retrieval import FileRetrieval, chunk_text
+
+
+def test_paragraphs_are_packed_up_to_the_chunk_size():
+    text = "\n\n".join(["a" * 40, "b" * 40, "c" * 40])
+    assert chunk_text(text, chunk_chars=100, overlap=0) == ["a" * 40 + "\n\n" + "b" * 40, "c" * 40]
+
+
+def test_long_paragraph_is_cut_with_overlap():
+    chunks = chunk_text("x" * 250, chunk_chars=100, overlap=20)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 90]
+
+
+@pytest.mark.parametrize("overlap", [100, 150, -1])
+def test_overlap_must_be_smaller_than_the_chunk(overlap):
+    with pytest.raises(ValueError):
+        chunk_text("x" * 500, chunk_chars=100, overlap=overlap)
+    with pytest.raises(ValueError):
+        FileRetrieval(store=None, chunk_chars=100, overlap=overlap)
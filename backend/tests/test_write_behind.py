@@ -0,0 +1,63 @@
+# backend/tests/test_write_behind.py
+import asyncio
+
+from write_behind import WriteBehindQueue
+
+
+def test_burst_is_written_in_batches():
+    async def scenario():
+        batches = []
+
+        async def handler(items):
+            batches.append(list(items))
+
+        queue = WriteBehindQueue(handler, max_batch=3, max_delay=0.01)
+        await queue.start()
+        for i in range(7):
+            await queue.submit(i)
+        await queue.close()
+        return queue, batches
+
+    queue, batches = asyncio.run(scenario())
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert queue.stats() == {"depth": 0, "written": 7, "batches": 3, "failed": 0}
+
+
+def test_failed_batch_is_counted_and_the_writer_keeps_going():
+    async def scenario():
+        written = []
+
+        async def handler(items):
+            if "bad" in items:
+                raise RuntimeError("disk full")
+            written.extend(items)
+
+        queue = WriteBehindQueue(handler, max_batch=10, max_delay=0)
+        await queue.start()
+        await queue.submit("bad")
+        await asyncio.sleep(0.01)
+        await queue.submit("good")
+        await queue.close()
+        return queue, written
+
+    queue, written = asyncio.run(scenario())
+    assert written == ["good"]
+    assert queue.failed == 1
+    assert queue.written == 1
+
+
+def test_close_without_drain_drops_queued_items():
+    async def scenario():
+        written = []
+
+        async def handler(items):
+            written.extend(items)
+
+        queue = WriteBehindQueue(handler, max_batch=10, max_delay=0.05)
+        await queue.start()
+        for i in range(3):
+            await queue.submit(i)
+        await queue.close(drain=False)
+        return written
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,92 @@
+# backend/vector_store.py
+import os
+import threading
+from urllib.parse import urlsplit
+
+from file_lock import FileLock
+
+
+class VectorStore:
+    """
+    One sentence-transformers model and one ChromaDB client, shared by every
+    feature that embeds text (semantic cache, file retrieval). The client is
+    embedded on 'path', or talks to the Chroma server at 'url', which is what
+    lets several worker processes share one index. Only one process at a
+    time may open the embedded index: a second one fails to load instead of
+    writing to the same files.
+
+    chromadb and sentence-transformers are imported by load() (or on first
+    use) so the rest of the API works without them. A failed load (missing
+    package, model not downloadable offline) is remembered, so callers see
+    available=False instead of retrying it on every request. Everything here
+    is blocking; run it off the event loop.
+    """
+
+    def __init__(self, path: str, model_name: str = "all-MiniLM-L6-v2", url: str = None):
+        self.path = path
+        self.url = url
+        self.model_name = model_name
+        self.available = True
+        self.error = None  # Why the last load failed, if it did
+        self._model = None
+        self._client = None
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._owner_lock = None  # Held while this process has the embedded index open
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    @property
+    def loading(self) -> bool:
+        """ True while another thread is importing the stack or loading the model. """
+        return self._client is None and self._lock.locked()
+
+    def load(self) -> bool:
+        """ Imports the vector stack and loads the model; returns False if unavailable. """
+        if self._client is not None:
+            return True
+        if not self.available:
+            return False
+        with self._lock:
+            if self._client is not None:
+                return True
+            try:
+                import chromadb
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                print(f"Vector search disabled, missing dependency: {e}")
+                self.available = False
+                return False
+            try:
+                self._model = SentenceTransformer(self.model_name)
+                self._client = self._connect(chromadb)
+            except Exception as e:
+                print(f"Vector search disabled, loading '{self.model_name}' failed: {e}")
+                self._model = None
+                self.available = False
+                self.error = str(e)
+                return False
+        return True
+
+    def _connect(self, chromadb):
+        if self.url is None:
+            os.makedirs(self.path, exist_ok=True)
+            owner_lock = FileLock(os.path.join(self.path, ".owner.lock"))
+            if not owner_lock.acquire(blocking=False):
+                raise RuntimeError(f"'{self.path}' is open in another process; share a Chroma server through CHROMA_URL")
+            self._owner_lock = owner_lock
+            return chromadb.PersistentClient(path=self.path)
+        parts = urlsplit(self.url)
+        ssl = parts.scheme == "https"
+        return chromadb.HttpClient(host=parts.hostname, port=parts.port or (443 if ssl else 8000), ssl=ssl)
+
+    def collection(self, name: str):
+        """ Cosine-space collection, created on first use. Call load() first. """
+        if name not in self._collections:
+            self._collections[name] = self._client.get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
+        return self._collections[name]
+
+    def embed(self, texts: list) -> list:
+        return self._model.encode(texts, normalize_embeddings=True).tolist()
@@ -0,0 +1,81 @@
+# backend/write_behind.py
+import asyncio
+
+
+class WriteBehindQueue:
+    """
+    Buffers items on an asyncio queue and hands them to an async handler in batches.
+
+    A single writer task waits for the first item, then gives the rest of a
+    burst max_delay seconds to arrive and takes up to max_batch items, so
+    bursts are written together. close() drains whatever is still queued
+    before returning.
+    """
+
+    def __init__(self, handler, max_batch: int = 100, max_delay: float = 0.05, max_size: int = 10000):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+        self._in_progress = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, item):
+        """ Queues an item; waits only when the queue is full. """
+        await self._queue.put(item)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + self._in_progress
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        if self.max_delay > 0:
+            await asyncio.sleep(self.max_delay)  # Let the rest of a burst arrive
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            self._in_progress = len(batch)
+            try:
+                await self.handler(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Error writing batch of {len(batch)}: {e}")
+            finally:
+                self._in_progress = 0
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def close(self, drain: bool = True):
+        """ Flushes queued items (unless drain=False drops them), then stops the writer. """
+        if self._task is None:
+            return
+        if drain:
+            await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
@@ -7,6 +7,8 @@ const API_BASE_URL = 'http://192.168.1.100:8000';
 
 interface FileInfo {
   filename: string;
+  size?: number;
+  modified?: number;
 }
 
 function FileList() {
@@ -81,21 +83,7 @@ function FileList() {
         );
         setUpdateMessage(response.data.message);
         setEditingFilename(null);
-        // Optionally, refresh the file list
-        const fetchFiles = async () => {
-          setLoading(true);
-          setError(null);
-          try {
-            const response = await axios.get<FileInfo[]>(`${API_BASE_URL}/api/files`);
-            setFiles(response.data);
-          } catch (err: any) {
-            console.error("Error fetching file list:", err);
-            setError(err.response?.data?.detail || 'Failed to load file list.');
-          } finally {
-            setLoading(false);
-          }
-        };
-        fetchFiles();
+        // The filename is unchanged, so the list doesn't need to be fetched again
       } catch (err: any) {
         console.error(`Error updating file ${editingFilename}:`, err);
         setUpdateMessage(err.response?.data?.detail || 'Failed to update file.');
@@ -107,21 +95,8 @@ function FileList() {
     try {
       const response = await axios.delete(`${API_BASE_URL}/api/files/${filename}`);
       setDeleteMessage(response.data.message);
-      // Refresh the file list
-      const fetchFiles = async () => {
-        setLoading(true);
-        setError(null);
-        try {
-          const response = await axios.get<FileInfo[]>(`${API_BASE_URL}/api/files`);
-          setFiles(response.data);
-        } catch (err: any) {
-          console.error("Error fetching file list:", err);
-          setError(err.response?.data?.detail || 'Failed to load file list.');
-        } finally {
-          setLoading(false);
-        }
-      };
-      fetchFiles();
+      // Drop the deleted file locally instead of fetching the whole list again
+      setFiles((prevFiles) => prevFiles.filter((file) => file.filename !== filename));
     } catch (err: any) {
       console.error(`Error deleting file ${filename}:`, err);
       setDeleteMessage(err.response?.data?.detail || 'Failed to delete file.');
@@ -17,14 +17,23 @@ function HistoryDisplay() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [currentPage, setCurrentPage] = useState(1);
+  // pageCursors[n - 1] is the 'before' cursor for page n; the next page's comes back in X-Next-Cursor
+  const [pageCursors, setPageCursors] = useState<(string | null)[]>([null]);
 
   useEffect(() => {
     const fetchHistory = async () => {
       setLoading(true);
       setError(null);
       try {
-        const response = await axios.get<HistoryItem[]>(`${API_BASE_URL}/api/history`);
+        const params: { limit: number; before?: string } = { limit: itemsPerPage };
+        const before = pageCursors[currentPage - 1];
+        if (before) {
+          params.before = before;
+        }
+        const response = await axios.get<HistoryItem[]>(`${API_BASE_URL}/api/history`, { params });
         setHistory(response.data);
+        const nextCursor = response.headers['x-next-cursor'] || null;
+        setPageCursors(cursors => [...cursors.slice(0, currentPage), nextCursor]);
       } catch (error: any) {
         console.error("Error fetching history:", error);
         setError('Failed to load history. Is the backend running?');
@@ -39,19 +48,18 @@ function HistoryDisplay() {
     };
 
     fetchHistory();
-  }, []);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentPage]); // Cursors only change as a result of fetching a page
 
-  const totalPages = Math.ceil(history.length / itemsPerPage);
-  const indexOfLastItem = currentPage * itemsPerPage;
-  const indexOfFirstItem = indexOfLastItem - itemsPerPage;
-  const currentItems = history.slice(indexOfFirstItem, indexOfLastItem);
+  // Pages are only known up to the one after the current page
+  const totalPages = pageCursors.length - 1 + (pageCursors[pageCursors.length - 1] ? 1 : 0);
 
   const paginate = (pageNumber: number) => setCurrentPage(pageNumber);
 
   const renderHistoryItems = () => {
     return (
       <ul style={{ listStyleType: 'none', padding: 0 }}>
-        {currentItems.map((item) => (
+        {history.map((item) => (
           <li key={item.id} style={{ marginBottom: '15px', borderBottom: '1px solid #ddd', paddingBottom: '15px' }}>
             <p><strong>Timestamp:</strong> {new Date(item.timestamp).toLocaleString()}</p>
             <p><strong>Question:</strong> {item.question}</p>
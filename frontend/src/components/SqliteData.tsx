@@ -8,10 +8,13 @@ interface HistoryItem {
   answer: string;
 }
 
+const pageSize = 50; // History rows fetched per request
+
 function SqliteData() {
   const [history, setHistory] = useState<HistoryItem[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   const [newQuestion, setNewQuestion] = useState('');
   const [newAnswer, setNewAnswer] = useState('');
@@ -23,16 +26,22 @@ function SqliteData() {
   //const backendUrl = 'http://localhost:8000';
   const backendUrl = 'http://192.168.1.100:8000';
 
-  const fetchData = useCallback(async () => {
+  // Fetches the newest page, or with 'before' the page after it, appended to what is shown
+  const fetchData = useCallback(async (before: string | null = null) => {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await fetch(`${backendUrl}/api/history`);
+      const params = new URLSearchParams({ limit: String(pageSize) });
+      if (before) {
+        params.set('before', before);
+      }
+      const response = await fetch(`${backendUrl}/api/history?${params}`);
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       const data: HistoryItem[] = await response.json();
-      setHistory(data);
+      setHistory(previous => (before ? [...previous, ...data] : data));
+      setNextCursor(response.headers.get('X-Next-Cursor'));
     } catch (e) {
       console.error("Failed to fetch history:", e);
       setError(e instanceof Error ? e.message : 'An unknown error occurred');
@@ -194,6 +203,9 @@ function SqliteData() {
           </li>
         ))}
       </ul>
+      {nextCursor && (
+        <button onClick={() => fetchData(nextCursor)} disabled={isLoading}>Load more</button>
+      )}
 
       
     </div>